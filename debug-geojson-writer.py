@@ -0,0 +1,141 @@
+import os
+import sys
+import tempfile
+
+import networkx as nx
+import numpy as np
+
+file_path = os.path.realpath(__file__)
+script_path = os.path.dirname(file_path)
+
+# Make library available in path
+library_paths = [
+    os.path.join(script_path, "lib"),
+    os.path.join(script_path, "lib", "converter"),
+]
+
+for p in library_paths:
+    if not (p in sys.path):
+        sys.path.insert(0, p)
+
+# Import library classes
+from tracking_decorator import TrackingDecorator
+from geojson_writer import GeojsonWriter
+from graph_to_geojson_converter import write_graph_to_geojson
+from isochrone_builder import write_nodes_to_geojson, write_points_to_geojson, write_polygon_to_geojson
+from point_generator import write_coords_to_geojson
+
+from geojson import FeatureCollection
+
+
+def get_expected_output(features):
+    # Formatting used before GeojsonWriter, see requirements.txt for the geojson version
+    features = [dict({"geometry": geometry, "type": "Feature"}, **({"properties": properties}
+                                                                  if properties is not None else {}))
+                for geometry, properties in features]
+
+    return "%s" % FeatureCollection(features)
+
+
+def get_written_output(write):
+    with tempfile.TemporaryDirectory() as temporary_path:
+        file_path = os.path.join(temporary_path, "output.geojson")
+        write(file_path)
+
+        with open(file_path, "r") as f:
+            return f.read()
+
+
+def get_test_cases():
+    rng = np.random.default_rng(0)
+    longitudes = 13 + rng.random(50)
+    latitudes = 52 + rng.random(50)
+    travel_time = 15
+
+    points = [{
+        "lon": float(longitude),
+        "lat": float(latitude),
+        f"mean_spatial_distance_{travel_time}min": float(longitude) * 100,
+        f"median_spatial_distance_{travel_time}min": 0,
+        f"min_spatial_distance_{travel_time}min": -0.0,
+        f"max_spatial_distance_{travel_time}min": 1e-7,
+        f"area_{travel_time}min": "Straße"
+    } for longitude, latitude in zip(longitudes.tolist(), latitudes.tolist())]
+
+    graph = nx.MultiDiGraph()
+    for node_id, (longitude, latitude) in enumerate(zip(longitudes.tolist(), latitudes.tolist())):
+        graph.add_node(node_id, x=longitude, y=latitude)
+    for node_id in range(len(longitudes) - 1):
+        graph.add_edge(node_id, node_id + 1)
+
+    mixed_features = [({"type": "Point", "coordinates": [1, 2.5]}, None),
+                      ({"type": "Point", "coordinates": [3, 4]}, {"a": [1, None]})]
+    point_properties = [{key: value for key, value in point.items() if key not in ["lon", "lat"]} for point in points]
+
+    return {
+        "write_features": (
+            lambda file_path: write_features(file_path, mixed_features),
+            mixed_features
+        ),
+        "empty": (
+            lambda file_path: write_features(file_path, []),
+            []
+        ),
+        "write_points_to_geojson": (
+            lambda file_path: write_points_to_geojson(file_path, points, travel_time),
+            [({"type": "Point", "coordinates": [point["lon"], point["lat"]]}, properties)
+             for point, properties in zip(points, point_properties)]
+        ),
+        "write_nodes_to_geojson": (
+            lambda file_path: write_nodes_to_geojson(file_path, longitudes, latitudes),
+            [({"type": "Point", "coordinates": [longitude, latitude]}, None)
+             for longitude, latitude in zip(longitudes.tolist(), latitudes.tolist())]
+        ),
+        "write_polygon_to_geojson": (
+            lambda file_path: write_polygon_to_geojson(file_path, longitudes, latitudes),
+            [({"type": "Polygon", "coordinates": [[longitude, latitude] for longitude, latitude in
+                                                  zip(longitudes.tolist(), latitudes.tolist())]}, None)]
+        ),
+        "write_coords_to_geojson": (
+            lambda file_path: write_coords_to_geojson(np.column_stack((longitudes, latitudes)), file_path),
+            [({"type": "Point", "coordinates": [longitude, latitude]}, None)
+             for longitude, latitude in zip(longitudes.tolist(), latitudes.tolist())]
+        ),
+        "write_graph_to_geojson": (
+            lambda file_path: write_graph_to_geojson(file_path, graph),
+            [({"type": "LineString", "coordinates": [[graph.nodes[u]["x"], graph.nodes[u]["y"]],
+                                                     [graph.nodes[v]["x"], graph.nodes[v]["y"]]]}, None)
+             for u, v in graph.edges()] +
+            [({"type": "Point", "coordinates": [graph.nodes[node_id]["x"], graph.nodes[node_id]["y"]]}, None)
+             for node_id in graph.nodes]
+        ),
+    }
+
+
+def write_features(file_path, features):
+    with GeojsonWriter(file_path) as writer:
+        writer.write_features(features)
+
+
+#
+# Main
+#
+
+@TrackingDecorator.track_time
+def main(argv):
+    num_failed = 0
+
+    # Compare the output of GeojsonWriter with the geojson library for the same features
+    for name, (write, features) in get_test_cases().items():
+        if get_written_output(write) == get_expected_output(features):
+            print(f"✓ {name} matches geojson output")
+        else:
+            print(f"✗️ {name} differs from geojson output")
+            num_failed += 1
+
+    if num_failed > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
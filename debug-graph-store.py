@@ -0,0 +1,60 @@
+import glob
+import os
+import sys
+from datetime import datetime
+
+file_path = os.path.realpath(__file__)
+script_path = os.path.dirname(file_path)
+
+# Make library available in path
+library_paths = [
+    os.path.join(script_path, "lib"),
+]
+
+for p in library_paths:
+    if not (p in sys.path):
+        sys.path.insert(0, p)
+
+# Import library classes
+from tracking_decorator import TrackingDecorator
+from graph_store import GRAPH_FILE_EXTENSION, GRAPHML_FILE_EXTENSION, load_graph, save_graph
+
+import osmnx as ox
+
+
+#
+# Main
+#
+
+@TrackingDecorator.track_time
+def main(argv):
+
+    # Set paths
+    base_results_path = os.path.join(script_path, "results", "results")
+
+    # Compare load time and file size of GraphML files and their binary counterparts
+    for graphml_file_path in glob.iglob(base_results_path + "/**/graphs/**/*" + GRAPHML_FILE_EXTENSION, recursive=True):
+        graph_file_path = graphml_file_path[:-len(GRAPHML_FILE_EXTENSION)] + GRAPH_FILE_EXTENSION
+        print(graphml_file_path)
+
+        start_time = datetime.now()
+        graph = ox.load_graphml(graphml_file_path)
+        graphml_load_time = datetime.now() - start_time
+
+        if not os.path.exists(graph_file_path):
+            save_graph(graph, graph_file_path)
+
+        start_time = datetime.now()
+        load_graph(graph_file_path)
+        graph_load_time = datetime.now() - start_time
+
+        graphml_size = os.path.getsize(graphml_file_path)
+        graph_size = os.path.getsize(graph_file_path)
+
+        print(f"graphml load time {graphml_load_time}, size {graphml_size / 1_000_000:.1f} MB")
+        print(f"binary  load time {graph_load_time}, size {graph_size / 1_000_000:.1f} MB")
+        print(f"speedup {graphml_load_time / graph_load_time:.1f}x, size ratio {graph_size / graphml_size:.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def encode_byte_strings(values):
+    """
+    Concatenates variable-length byte strings into one buffer, so that no value is padded to the longest one
+    :param values: list of byte strings
+    :return: uint8 array of all bytes and int64 array of offsets with one more entry than there are values
+    """
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+
+    return np.frombuffer(b"".join(values), dtype=np.uint8), offsets
+
+
+def decode_byte_strings(data, offsets):
+    """
+    Splits a buffer created with encode_byte_strings into its byte strings
+    :param data: uint8 array of all bytes
+    :param offsets: int64 array of offsets
+    :return: list of byte strings
+    """
+    buffer = data.tobytes()
+    offsets = offsets.tolist()
+
+    return [buffer[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
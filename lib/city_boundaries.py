@@ -0,0 +1,47 @@
+import json
+import os
+
+from shapely import vectorized
+from shapely.geometry import shape
+from shapely.ops import unary_union
+from shapely.prepared import prep
+
+
+def read_geojson(file_path):
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def get_polygons(geojson):
+    return [shape(feature["geometry"]) for feature in geojson["features"]]
+
+
+# Boundaries by file path so that they are parsed only once per process
+city_boundaries_cache = {}
+
+
+def get_city_boundaries(data_path, city_id):
+    file_path = os.path.join(data_path, "cities", city_id, "boundaries", "boundaries.geojson")
+
+    if file_path not in city_boundaries_cache:
+        city_boundaries_cache[file_path] = CityBoundaries(get_polygons(read_geojson(file_path)))
+
+    return city_boundaries_cache[file_path]
+
+
+#
+# Main
+#
+
+class CityBoundaries:
+    """
+    Boundary polygons of a city merged into a single prepared geometry for fast containment tests
+    """
+
+    def __init__(self, polygons):
+        self.polygon = unary_union(polygons)
+        self.prepared_polygon = prep(self.polygon)
+        self.bounds = self.polygon.bounds
+
+    def contains(self, longitudes, latitudes):
+        return vectorized.contains(self.prepared_polygon, longitudes, latitudes)
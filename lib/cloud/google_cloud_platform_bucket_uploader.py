@@ -5,6 +5,14 @@ from pathlib import Path
 from google.cloud import storage
 from tracking_decorator import TrackingDecorator
 
+# Sample point files published to the bucket, the memory-mapped array and its metadata are internal
+PUBLISHED_SAMPLE_POINT_FILE_NAMES = ["sample-points.csv", "sample-points.geojson"]
+
+
+def get_config_file_path():
+    script_path = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(script_path, "open-public-transport-2e54e67b8c92.json")
+
 
 #
 # Main
@@ -12,16 +20,16 @@ from tracking_decorator import TrackingDecorator
 
 class GoogleCloudPlatformBucketUploader:
 
+    def is_configured(self):
+        return Path(get_config_file_path()).exists()
+
     @TrackingDecorator.track_time
     def upload_data(self, logger, data_path, city_id, project_id, bucket_name, quiet=False):
         """
         See https://cloud.google.com/storage/docs/creating-buckets#storage-create-bucket-python
         """
 
-        # Set script path
-        file_path = os.path.realpath(__file__)
-        script_path = os.path.dirname(file_path)
-        config_file_path = os.path.join(script_path, "open-public-transport-2e54e67b8c92.json")
+        config_file_path = get_config_file_path()
 
         # Check for config file
         if not Path(config_file_path).exists():
@@ -43,7 +51,11 @@ class GoogleCloudPlatformBucketUploader:
             if not quiet:
                 logger.log_line("✓️ Uploading " + os.path.basename(file_path))
 
-        for file_path in glob.iglob(data_path + "/sample-points/*"):
+        for file_path in [os.path.join(data_path, "sample-points", file_name)
+                          for file_name in PUBLISHED_SAMPLE_POINT_FILE_NAMES]:
+            if not os.path.exists(file_path):
+                continue
+
             blob = bucket.blob(os.path.join(city_id, "sample-points", os.path.basename(file_path)))
             blob.upload_from_filename(file_path)
 
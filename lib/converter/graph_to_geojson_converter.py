@@ -1,46 +1,29 @@
 import os
 
-from geojson import FeatureCollection
+from geojson_writer import GeojsonWriter
 from tracking_decorator import TrackingDecorator
 
 
 def write_graph_to_geojson(file_path, graph):
-    edge_features = get_edge_features(graph)
-    node_features = get_node_features(graph)
-    collection = FeatureCollection(edge_features + node_features)
-
-    with open(file_path, "w") as f:
-        f.write("%s" % collection)
+    with GeojsonWriter(file_path) as writer:
+        writer.write_features(get_edge_features(graph))
+        writer.write_features(get_node_features(graph))
 
 
 def get_edge_features(graph):
-    features = []
-
-    if len(graph.edges) > 0:
-        for node_ids in graph.edges:
-            node_start = graph.nodes[node_ids[0]]
-            node_end = graph.nodes[node_ids[1]]
-            feature = {}
-            feature["geometry"] = {"type": "LineString", "coordinates": [[node_start["x"], node_start["y"]],
-                                                                         [node_end["x"], node_end["y"]]]}
-            feature["type"] = "Feature"
-            features.append(feature)
+    for node_ids in graph.edges:
+        node_start = graph.nodes[node_ids[0]]
+        node_end = graph.nodes[node_ids[1]]
 
-    return features
+        yield {"type": "LineString", "coordinates": [[node_start["x"], node_start["y"]],
+                                                     [node_end["x"], node_end["y"]]]}, None
 
 
 def get_node_features(graph):
-    features = []
-
-    if len(graph.nodes) > 0:
-        for node_id in graph.nodes:
-            node = graph.nodes[node_id]
-            feature = {}
-            feature["geometry"] = {"type": "Point", "coordinates": [node["x"], node["y"]]}
-            feature["type"] = "Feature"
-            features.append(feature)
+    for node_id in graph.nodes:
+        node = graph.nodes[node_id]
 
-    return features
+        yield {"type": "Point", "coordinates": [node["x"], node["y"]]}, None
 
 
 #
@@ -1,16 +1,15 @@
-import glob
 import json
 import os
 
 import osm2geojson
+from overpass_cache import OverpassCache
+from overpass_json import iterate_elements
 from tracking_decorator import TrackingDecorator
 
 
 def load_json(file_path):
-    with open(file_path, "r") as f:
-        text = f.read()
-
-    return json.loads(text.replace("'", ""))
+    # osm2geojson resolves references between elements and therefore needs all of them at once
+    return {"elements": list(iterate_elements(file_path))}
 
 
 def convert_json_to_geojson(file_path, json_content):
@@ -34,18 +33,25 @@ class OsmToGeojsonConverter:
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
-        for file_path in glob.iglob(data_path + "/*.json"):
+        cache = OverpassCache(data_path)
+
+        for metadata in cache.get_entries():
+            json_content = None
+
+            for name in metadata["names"]:
+                results_file_path = os.path.join(results_path, name + ".geojson")
 
-            results_file_path = os.path.join(results_path, os.path.basename(file_path).replace(".json", ".geojson"))
+                # Check if result needs to be generated, also after the cached response has been downloaded again
+                if clean or not os.path.exists(results_file_path) or \
+                        os.path.getmtime(results_file_path) < metadata["created"]:
 
-            # Check if result needs to be generated
-            if clean or not os.path.exists(results_file_path):
+                    if json_content is None:
+                        json_content = load_json(cache.get_entry_file_path(metadata))
 
-                json_content = load_json(file_path)
-                convert_json_to_geojson(
-                    file_path=results_file_path,
-                    json_content=json_content
-                )
+                    convert_json_to_geojson(
+                        file_path=results_file_path,
+                        json_content=json_content
+                    )
 
-                if not quiet:
-                    logger.log_line(f"✓ Convert {public_transport_type} to GeoJSON")
+                    if not quiet:
+                        logger.log_line(f"✓ Convert {public_transport_type} to GeoJSON")
@@ -0,0 +1,123 @@
+import numpy as np
+
+# Mean earth radius in meters
+EARTH_RADIUS = 6_371_008.8
+
+# WGS-84 ellipsoid
+ELLIPSOID_SEMI_MAJOR_AXIS = 6_378_137.0
+ELLIPSOID_FLATTENING = 1 / 298.257223563
+ELLIPSOID_SEMI_MINOR_AXIS = (1 - ELLIPSOID_FLATTENING) * ELLIPSOID_SEMI_MAJOR_AXIS
+
+
+# See https://en.wikipedia.org/wiki/Haversine_formula
+def get_haversine_distances(lat, lon, latitudes, longitudes, earth_radius=EARTH_RADIUS):
+    """
+    Calculates great-circle distances between one point and an array of points
+    :param lat: latitude of the start point
+    :param lon: longitude of the start point
+    :param latitudes: latitudes of the target points
+    :param longitudes: longitudes of the target points
+    :param earth_radius: earth radius, determines the unit of the result
+    :return: array of distances
+    """
+    lat_a = np.radians(lat)
+    lon_a = np.radians(lon)
+    lat_b = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon_b = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    distance_lon = lon_b - lon_a
+    distance_lat = lat_b - lat_a
+
+    a = np.sin(distance_lat / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin(distance_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return earth_radius * c
+
+
+# See https://en.wikipedia.org/wiki/Vincenty%27s_formulae
+def get_ellipsoidal_distances(lat, lon, latitudes, longitudes, tolerance=0.001, max_iterations=200):
+    """
+    Calculates distances on the WGS-84 ellipsoid between one point and an array of points
+    :param lat: latitude of the start point
+    :param lon: longitude of the start point
+    :param latitudes: latitudes of the target points
+    :param longitudes: longitudes of the target points
+    :param tolerance: maximum error in meters caused by stopping the iteration
+    :param max_iterations: number of iterations after which nearly antipodal points fall back to haversine
+    :return: array of distances in meters
+    """
+    a = ELLIPSOID_SEMI_MAJOR_AXIS
+    b = ELLIPSOID_SEMI_MINOR_AXIS
+    f = ELLIPSOID_FLATTENING
+
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    u_a = np.arctan((1 - f) * np.tan(np.radians(lat)))
+    u_b = np.arctan((1 - f) * np.tan(np.radians(latitudes)))
+    sin_u_a, cos_u_a = np.sin(u_a), np.cos(u_a)
+    sin_u_b, cos_u_b = np.sin(u_b), np.cos(u_b)
+
+    distance_lon = np.radians(longitudes - lon)
+    lambda_ = distance_lon
+    converged = np.zeros(distance_lon.shape, dtype=bool)
+
+    # Convert tolerance in meters to a tolerance of the longitude on the auxiliary sphere
+    lambda_tolerance = tolerance / a
+
+    for _ in range(max_iterations):
+        sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+        sin_sigma = np.sqrt((cos_u_b * sin_lambda) ** 2 + (cos_u_a * sin_u_b - sin_u_a * cos_u_b * cos_lambda) ** 2)
+        cos_sigma = sin_u_a * sin_u_b + cos_u_a * cos_u_b * cos_lambda
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+
+        # Coincident points have a distance of zero and are handled below
+        sin_alpha = np.divide(cos_u_a * cos_u_b * sin_lambda, sin_sigma, out=np.zeros_like(sin_sigma),
+                              where=sin_sigma != 0)
+        cos_sq_alpha = 1 - sin_alpha ** 2
+
+        # Points on the equator have no defined midpoint latitude
+        cos_2_sigma_m = np.where(cos_sq_alpha != 0,
+                                 cos_sigma - 2 * sin_u_a * sin_u_b / np.where(cos_sq_alpha != 0, cos_sq_alpha, 1), 0)
+
+        c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+        lambda_previous = lambda_
+        lambda_ = distance_lon + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2_sigma_m + c * cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2)))
+
+        converged = np.abs(lambda_ - lambda_previous) <= lambda_tolerance
+        if np.all(converged):
+            break
+
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2_sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2_sigma_m ** 2) - big_b / 6 * cos_2_sigma_m * (-3 + 4 * sin_sigma ** 2) * (
+            -3 + 4 * cos_2_sigma_m ** 2)))
+
+    distances = b * big_a * (sigma - delta_sigma)
+    distances[sin_sigma == 0] = 0
+
+    # Fall back to great-circle distance where the iteration does not converge
+    if not np.all(converged):
+        distances[~converged] = get_haversine_distances(lat, lon, latitudes[~converged], longitudes[~converged])
+
+    return distances
+
+
+def get_distances(lat, lon, latitudes, longitudes, ellipsoidal=False, tolerance=0.001):
+    """
+    Calculates distances in meters between one point and an array of points
+    :param lat: latitude of the start point
+    :param lon: longitude of the start point
+    :param latitudes: latitudes of the target points
+    :param longitudes: longitudes of the target points
+    :param ellipsoidal: if true distances are calculated on the WGS-84 ellipsoid, otherwise on a sphere
+    :param tolerance: maximum error in meters of ellipsoidal distances
+    :return: array of distances in meters
+    """
+    if ellipsoidal:
+        return get_ellipsoidal_distances(lat, lon, latitudes, longitudes, tolerance=tolerance)
+    else:
+        return get_haversine_distances(lat, lon, latitudes, longitudes)
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+
+
+def round_coordinates(coordinates, precision):
+    if isinstance(coordinates, (list, tuple)):
+        return [round_coordinates(coordinate, precision) for coordinate in coordinates]
+    else:
+        return round(coordinates, precision)
+
+
+def get_feature(geometry, properties=None, precision=None):
+    if precision is not None:
+        geometry = dict(geometry, coordinates=round_coordinates(geometry["coordinates"], precision))
+
+    feature = {"geometry": geometry, "type": "Feature"}
+
+    if properties is not None:
+        feature["properties"] = properties
+
+    return feature
+
+
+class GeojsonWriter:
+    """
+    Writes a feature collection to disk feature by feature so that memory does not grow with the number of features.
+    Without a precision the output is byte-identical to formatting a FeatureCollection of the same features with
+    geojson 2.5, i.e. coordinates at full precision and properties only on features that have them. Unlike geojson,
+    non-finite numbers are written as NaN or Infinity instead of failing the whole collection
+    """
+
+    def __init__(self, file_path, precision=None, compress=False):
+        self.file_path = file_path
+        self.precision = precision
+        self.compress = compress or file_path.endswith(".gz")
+        self.temporary_file_path = file_path + ".tmp"
+        self.file = None
+        self.num_features = 0
+
+    def __enter__(self):
+        if self.compress:
+            self.file = gzip.open(self.temporary_file_path, "wt")
+        else:
+            self.file = open(self.temporary_file_path, "w")
+
+        self.file.write("{\"features\": [")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.file.write("], \"type\": \"FeatureCollection\"}")
+        finally:
+            self.file.close()
+
+        # Only replace an existing file once the collection is complete
+        if exc_type is None:
+            os.replace(self.temporary_file_path, self.file_path)
+        else:
+            os.remove(self.temporary_file_path)
+
+    def write_feature(self, geometry, properties=None):
+        if self.num_features > 0:
+            self.file.write(", ")
+
+        self.file.write(json.dumps(get_feature(geometry, properties, self.precision), sort_keys=True))
+        self.num_features += 1
+
+    def write_features(self, features):
+        for geometry, properties in features:
+            self.write_feature(geometry, properties)
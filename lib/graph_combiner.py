@@ -1,9 +1,10 @@
 import os
 
 import networkx as nx
-import osmnx as ox
 from tqdm import tqdm
 
+from graph_store import GRAPH_FILE_EXTENSION, graph_exists, load_graph, save_graph
+from node_index import NodeIndex
 from tracking_decorator import TrackingDecorator
 
 
@@ -18,7 +19,7 @@ def get_station_node_ids(stations):
 
 
 def load_transport_graph(file_path):
-    return ox.load_graphml(file_path)
+    return load_graph(file_path)
 
 
 #
@@ -28,38 +29,32 @@ def load_transport_graph(file_path):
 class GraphCombiner:
 
     @TrackingDecorator.track_time
-    def run(self, logger, results_path, graph_transport, graph_walk, stations, clean=False, quiet=False):
+    def run(self, logger, results_path, graph_transport, graph_walk, stations, export_graphml=False, clean=False,
+            quiet=False):
 
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
         # Define file path
-        file_path = os.path.join(results_path, "all_composed.graphml")
+        file_path = os.path.join(results_path, "all_composed" + GRAPH_FILE_EXTENSION)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not graph_exists(file_path):
             graph = nx.algorithms.operators.all.compose_all([graph_transport, graph_walk])
 
-            graph_transport_nodes, graph_transport_edges = ox.graph_to_gdfs(graph_transport)
-            graph_transport_node_ids = list(graph_transport_nodes.axes[0])
+            graph_transport_node_ids = list(graph_transport.nodes)
 
-            # Iterate over all nodes of first graph
-            for transport_node_id in tqdm(iterable=graph_transport_node_ids,
-                                        desc="Compose graphs",
-                                        total=len(graph_transport_node_ids),
-                                        unit="node"):
-
-                # Get coordinates of node
-                transport_node_point = graph_transport.nodes[transport_node_id]
-
-                # Get node in walk graph that is closest to station node
-                walk_node_id, distance = ox.nearest_nodes(
-                    G=graph_walk,
-                    X=transport_node_point["x"],
-                    Y=transport_node_point["y"],
-                    return_dist=True
-                )
+            # Get nodes in walk graph that are closest to station nodes
+            walk_node_ids, _ = NodeIndex.from_graph(graph_walk).get_nearest_nodes(
+                longitudes=[float(graph_transport.nodes[node_id]["x"]) for node_id in graph_transport_node_ids],
+                latitudes=[float(graph_transport.nodes[node_id]["y"]) for node_id in graph_transport_node_ids]
+            )
 
+            # Iterate over all nodes of first graph
+            for transport_node_id, walk_node_id in tqdm(iterable=zip(graph_transport_node_ids, walk_node_ids.tolist()),
+                                                        desc="Compose graphs",
+                                                        total=len(graph_transport_node_ids),
+                                                        unit="node"):
                 # Add edges in both directions
                 graph.add_edge(
                     transport_node_id,
@@ -82,7 +77,7 @@ class GraphCombiner:
                     length=0,
                     time=0)
 
-            ox.save_graphml(graph, file_path)
+            save_graph(graph, file_path, export_graphml=export_graphml)
 
             return graph
         else:
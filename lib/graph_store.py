@@ -0,0 +1,174 @@
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+from shapely import wkb
+from shapely.geometry.base import BaseGeometry
+
+from byte_array import decode_byte_strings, encode_byte_strings
+
+GRAPH_FILE_EXTENSION = ".graph.npz"
+GRAPHML_FILE_EXTENSION = ".graphml"
+
+
+def get_graphml_file_path(file_path):
+    return file_path[:-len(GRAPH_FILE_EXTENSION)] + GRAPHML_FILE_EXTENSION
+
+
+def graph_exists(file_path):
+    return os.path.exists(file_path) or os.path.exists(get_graphml_file_path(file_path))
+
+
+def encode_values(arrays, name, values):
+    """
+    Stores values of one type in arrays, strings, geometries and values of mixed type as one byte buffer plus offsets
+    so that rows are not padded to the longest value
+    :return: kind of the values
+    """
+    if all(isinstance(value, (bool, np.bool_)) for value in values):
+        arrays[name] = np.array(values, dtype=bool)
+        return "bool"
+    elif all(isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)) for value in values):
+        arrays[name] = np.array(values, dtype=np.int64)
+        return "int"
+    elif all(isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+             for value in values):
+        arrays[name] = np.array(values, dtype=np.float64)
+        return "float"
+    elif all(isinstance(value, str) for value in values):
+        kind, byte_strings = "str", [value.encode("utf-8") for value in values]
+    elif all(isinstance(value, BaseGeometry) for value in values):
+        kind, byte_strings = "geometry", [value.wkb for value in values]
+    else:
+        kind, byte_strings = "json", [json.dumps(value, default=str).encode("utf-8") for value in values]
+
+    arrays[name], arrays[f"{name}_offsets"] = encode_byte_strings(byte_strings)
+    return kind
+
+
+def decode_values(kind, arrays, name):
+    if kind in ["bool", "int", "float"]:
+        return arrays[name].tolist()
+
+    # Graphs saved before values were stored as byte buffers hold fixed-width strings with hex geometries
+    if f"{name}_offsets" not in arrays:
+        if kind == "geometry":
+            return [wkb.loads(value, hex=True) for value in arrays[name].tolist()]
+        elif kind == "json":
+            return [json.loads(value) for value in arrays[name].tolist()]
+        else:
+            return arrays[name].tolist()
+
+    byte_strings = decode_byte_strings(arrays[name], arrays[f"{name}_offsets"])
+
+    if kind == "geometry":
+        return [wkb.loads(value) for value in byte_strings]
+    elif kind == "json":
+        return [json.loads(value.decode("utf-8")) for value in byte_strings]
+    else:
+        return [value.decode("utf-8") for value in byte_strings]
+
+
+def encode_columns(arrays, prefix, rows):
+    """
+    Stores attributes of nodes or edges column by column, attributes that are not set for every row get an
+    additional mask
+    """
+    columns = {}
+    names = sorted({name for data in rows for name in data.keys()})
+
+    for index, name in enumerate(names):
+        present = np.array([name in data for data in rows], dtype=bool)
+        kind = encode_values(arrays, f"{prefix}_{index}", [data[name] for data in rows if name in data])
+
+        if not np.all(present):
+            arrays[f"{prefix}_{index}_present"] = present
+
+        columns[name] = {"kind": kind, "index": index, "complete": bool(np.all(present))}
+
+    return columns
+
+
+def decode_columns(arrays, prefix, columns, num_rows):
+    rows = [{} for _ in range(num_rows)]
+
+    for name, column in columns.items():
+        values = decode_values(column["kind"], arrays, f"{prefix}_{column['index']}")
+
+        if column["complete"]:
+            for data, value in zip(rows, values):
+                data[name] = value
+        else:
+            for row_index, value in zip(np.flatnonzero(arrays[f"{prefix}_{column['index']}_present"]).tolist(), values):
+                rows[row_index][name] = value
+
+    return rows
+
+
+def save_graph(graph, file_path, export_graphml=False):
+    """
+    Saves a graph as compressed node and edge arrays plus attribute columns
+    :param graph: multi di graph to save
+    :param file_path: path of the graph file ending with .graph.npz
+    :param export_graphml: if true the graph is additionally exported as GraphML
+    """
+    arrays = {}
+
+    node_ids = list(graph.nodes)
+    node_positions = {node_id: position for position, node_id in enumerate(node_ids)}
+    node_id_kind = encode_values(arrays, "node_ids", node_ids)
+    node_columns = encode_columns(arrays, "node", [data for _, data in graph.nodes(data=True)])
+
+    edges = list(graph.edges(keys=True, data=True))
+    arrays["edge_sources"] = np.array([node_positions[u] for u, _, _, _ in edges], dtype=np.int64)
+    arrays["edge_targets"] = np.array([node_positions[v] for _, v, _, _ in edges], dtype=np.int64)
+    edge_key_kind = encode_values(arrays, "edge_keys", [key for _, _, key, _ in edges])
+    edge_columns = encode_columns(arrays, "edge", [data for _, _, _, data in edges])
+
+    arrays["metadata"] = np.array(json.dumps({
+        "graph": graph.graph,
+        "node_id_kind": node_id_kind,
+        "edge_key_kind": edge_key_kind,
+        "node_columns": node_columns,
+        "edge_columns": edge_columns
+    }, default=str))
+
+    # Write to temporary file first so that an interrupted save does not leave a broken cache
+    temporary_file_path = file_path + ".tmp.npz"
+    np.savez_compressed(temporary_file_path, **arrays)
+    os.replace(temporary_file_path, file_path)
+
+    if export_graphml:
+        ox.save_graphml(graph, get_graphml_file_path(file_path))
+
+
+def load_graph(file_path):
+    """
+    Loads a graph saved with save_graph, an existing GraphML file with the same name is converted on first load
+    :param file_path: path of the graph file ending with .graph.npz
+    :return: multi di graph
+    """
+    if not os.path.exists(file_path):
+        graph = ox.load_graphml(get_graphml_file_path(file_path))
+        save_graph(graph, file_path)
+        return graph
+
+    with np.load(file_path, allow_pickle=False) as arrays:
+        metadata = json.loads(arrays["metadata"].item())
+
+        node_ids = decode_values(metadata["node_id_kind"], arrays, "node_ids")
+        node_data = decode_columns(arrays, "node", metadata["node_columns"], len(node_ids))
+
+        edge_sources = arrays["edge_sources"].tolist()
+        edge_targets = arrays["edge_targets"].tolist()
+        edge_keys = decode_values(metadata["edge_key_kind"], arrays, "edge_keys")
+        edge_data = decode_columns(arrays, "edge", metadata["edge_columns"], len(edge_keys))
+
+    graph = nx.MultiDiGraph(**metadata["graph"])
+    graph.add_nodes_from(zip(node_ids, node_data))
+    graph.add_edges_from((node_ids[u], node_ids[v], key, data)
+                         for u, v, key, data in zip(edge_sources, edge_targets, edge_keys, edge_data))
+
+    return graph
@@ -1,7 +1,6 @@
 import os
 
-import osmnx as ox
-
+from graph_store import GRAPH_FILE_EXTENSION, graph_exists, load_graph, save_graph
 from tracking_decorator import TrackingDecorator
 
 
@@ -19,7 +18,7 @@ def transform_graph(graph):
 
 
 def load_transport_graph(file_path):
-    return ox.load_graphml(file_path)
+    return load_graph(file_path)
 
 
 #
@@ -29,20 +28,19 @@ def load_transport_graph(file_path):
 class GraphTransformer:
 
     @TrackingDecorator.track_time
-    def run(self, logger, results_path, graph, clean=False,
-            quiet=False):
+    def run(self, logger, results_path, graph, export_graphml=False, clean=False, quiet=False):
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
         # Define file path
-        file_path = os.path.join(results_path, "walk-transformed.graphml")
+        file_path = os.path.join(results_path, "walk-transformed" + GRAPH_FILE_EXTENSION)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not graph_exists(file_path):
             transformed_graph = transform_graph(graph)
 
             # Save graph
-            ox.save_graphml(transformed_graph, file_path)
+            save_graph(transformed_graph, file_path, export_graphml=export_graphml)
 
             return transformed_graph
         else:
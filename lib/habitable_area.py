@@ -0,0 +1,214 @@
+import json
+import os
+
+import numpy as np
+from shapely import vectorized, wkb
+from shapely.geometry import Polygon, box
+from shapely.ops import triangulate, unary_union
+from shapely.prepared import prep
+from tqdm import tqdm
+
+from city_boundaries import get_city_boundaries
+from landuse_index import get_file_signature, get_landuse_file_paths
+from tracking_decorator import TrackingDecorator
+
+
+def get_boundaries_file_path(data_path, city_id):
+    return os.path.join(data_path, "cities", city_id, "boundaries", "boundaries.geojson")
+
+
+def get_polygon_parts(geometry):
+    if isinstance(geometry, Polygon):
+        return [geometry] if not geometry.is_empty else []
+    elif hasattr(geometry, "geoms"):
+        return [part for geom in geometry.geoms for part in get_polygon_parts(geom)]
+    else:
+        return []
+
+
+def get_habitable_polygon(boundary_polygon, landuse_polygons):
+    # Land use data from OSM contains self-intersecting polygons which need to be repaired before the union
+    landuse_polygons = [polygon if polygon.is_valid else polygon.buffer(0) for polygon in landuse_polygons]
+
+    return boundary_polygon.difference(unary_union(landuse_polygons))
+
+
+def get_triangles(polygon):
+    """
+    Splits a polygon into triangles. Delaunay triangles over the vertices of the polygon contain no
+    vertices in their interior, so their intersections with the polygon are convex and can be split into fans
+    :param polygon: polygon
+    :return: list of triangles as tuples of three coordinates
+    """
+    triangles = []
+
+    for delaunay_triangle in triangulate(polygon):
+        for part in get_polygon_parts(delaunay_triangle.intersection(polygon)):
+            coordinates = list(part.exterior.coords)[:-1]
+
+            for index in range(1, len(coordinates) - 1):
+                triangles.append((coordinates[0], coordinates[index], coordinates[index + 1]))
+
+    return triangles
+
+
+def get_habitable_triangles(habitable_polygon, grid_size=32):
+    """
+    Decomposes the habitable area into triangles, cell by cell of a grid so that each triangulation stays small
+    :param habitable_polygon: habitable area
+    :param grid_size: number of grid columns and rows
+    :return: array of triangles with shape (n, 3, 2)
+    """
+    triangles = []
+
+    xmin, ymin, xmax, ymax = habitable_polygon.bounds
+    cell_width = (xmax - xmin) / grid_size
+    cell_height = (ymax - ymin) / grid_size
+
+    for column in tqdm(iterable=range(grid_size), unit="columns", desc="Triangulate habitable area"):
+        for row in range(grid_size):
+            cell = box(xmin + column * cell_width, ymin + row * cell_height,
+                       xmin + (column + 1) * cell_width, ymin + (row + 1) * cell_height)
+
+            for part in get_polygon_parts(habitable_polygon.intersection(cell)):
+                triangles += get_triangles(part)
+
+    return np.array(triangles, dtype=np.float64).reshape(-1, 3, 2)
+
+
+def get_triangle_areas(triangles):
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    return np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])) / 2
+
+
+def get_habitable_area_signature(data_path, city_id):
+    return get_file_signature([get_boundaries_file_path(data_path, city_id)] +
+                              get_landuse_file_paths(data_path, city_id))
+
+
+def save_habitable_area(file_path, habitable_area, signature):
+    temporary_file_path = file_path + ".tmp.npz"
+    np.savez_compressed(
+        temporary_file_path,
+        polygon=np.array(habitable_area.polygon.wkb_hex),
+        triangles=habitable_area.triangles,
+        signature=np.array(json.dumps(signature))
+    )
+    os.replace(temporary_file_path, file_path)
+
+
+def load_habitable_area(file_path, signature):
+    if not os.path.exists(file_path):
+        return None
+
+    with np.load(file_path, allow_pickle=False) as arrays:
+        if json.loads(arrays["signature"].item()) != signature:
+            return None
+
+        return HabitableArea(wkb.loads(arrays["polygon"].item(), hex=True), arrays["triangles"])
+
+
+#
+# Main
+#
+
+class HabitableArea:
+    """
+    City area without invalid land use, decomposed into triangles so that points can be sampled without rejection
+    """
+
+    def __init__(self, polygon, triangles):
+        self.polygon = polygon
+        self.prepared_polygon = prep(polygon)
+        self.triangles = triangles
+        self.cumulative_areas = np.cumsum(get_triangle_areas(triangles))
+
+    def contains(self, longitudes, latitudes):
+        return vectorized.contains(self.prepared_polygon, longitudes, latitudes)
+
+    def sample(self, num_points, rng=np.random):
+        """
+        Draws uniformly distributed points by picking triangles weighted by their area and a point within each
+        :param num_points: number of points
+        :param rng: random number generator
+        :return: arrays of longitudes and latitudes
+        """
+        triangle_indices = np.minimum(np.searchsorted(self.cumulative_areas,
+                                                      rng.uniform(0, self.cumulative_areas[-1], num_points),
+                                                      side="right"), len(self.triangles) - 1)
+
+        # Reflect points of the unit square that fall outside the unit triangle
+        u = rng.uniform(0, 1, num_points)
+        v = rng.uniform(0, 1, num_points)
+        outside = u + v > 1
+        u[outside] = 1 - u[outside]
+        v[outside] = 1 - v[outside]
+
+        a = self.triangles[triangle_indices, 0]
+        b = self.triangles[triangle_indices, 1]
+        c = self.triangles[triangle_indices, 2]
+        points = a + u[:, None] * (b - a) + v[:, None] * (c - a)
+
+        return points[:, 0], points[:, 1]
+
+    def sample_stratified(self, num_points, rng=np.random):
+        """
+        Draws one jittered point per cell of a grid over the habitable area, with cells sized so that the expected
+        number of points inside the area matches the requested number. Surplus points are dropped at random and
+        missing points are drawn uniformly
+        :param num_points: number of points
+        :param rng: random number generator
+        :return: arrays of longitudes and latitudes
+        """
+        xmin, ymin, xmax, ymax = self.polygon.bounds
+
+        # Make cells roughly square in meters rather than in degrees
+        aspect_ratio = np.cos(np.radians((ymin + ymax) / 2))
+        cell_width = np.sqrt(self.cumulative_areas[-1] / (num_points * aspect_ratio))
+        cell_height = cell_width * aspect_ratio
+
+        columns, rows = np.meshgrid(np.arange(xmin, xmax, cell_width), np.arange(ymin, ymax, cell_height))
+        longitudes = columns.ravel() + rng.uniform(0, cell_width, columns.size)
+        latitudes = rows.ravel() + rng.uniform(0, cell_height, rows.size)
+
+        inside = self.contains(longitudes, latitudes)
+        longitudes, latitudes = longitudes[inside], latitudes[inside]
+
+        if len(longitudes) > num_points:
+            keep = np.sort(rng.choice(len(longitudes), num_points, replace=False))
+            return longitudes[keep], latitudes[keep]
+        else:
+            missing_longitudes, missing_latitudes = self.sample(num_points - len(longitudes), rng)
+            return np.concatenate((longitudes, missing_longitudes)), np.concatenate((latitudes, missing_latitudes))
+
+
+class HabitableAreaBuilder:
+
+    @TrackingDecorator.track_time
+    def run(self, logger, data_path, results_path, city_id, landuse_index, clean=False, quiet=False):
+        # Make results path
+        os.makedirs(os.path.join(results_path), exist_ok=True)
+
+        # Define file path
+        file_path = os.path.join(results_path, "habitable-area.npz")
+
+        signature = get_habitable_area_signature(data_path, city_id)
+
+        # Check if result needs to be generated
+        habitable_area = None if clean else load_habitable_area(file_path, signature)
+
+        if habitable_area is None:
+            habitable_polygon = get_habitable_polygon(get_city_boundaries(data_path, city_id).polygon,
+                                                      landuse_index.polygons)
+            habitable_area = HabitableArea(habitable_polygon, get_habitable_triangles(habitable_polygon))
+
+            # Save habitable area
+            save_habitable_area(file_path, habitable_area, signature)
+
+            if not quiet:
+                logger.log_line(f"✓ Build {file_path} with {len(habitable_area.triangles)} triangles")
+        else:
+            if not quiet:
+                logger.log_line(f"✓ Load {file_path} with {len(habitable_area.triangles)} triangles")
+
+        return habitable_area
@@ -1,58 +1,112 @@
+import hashlib
 import json
+import math
+import multiprocessing
 import os.path
+from collections import OrderedDict
 
-import geopy.distance
-import networkx as nx
 import numpy as np
-import osmnx as ox
-from geojson import FeatureCollection
-from osgeo import ogr
 from shapely.geometry import MultiPoint, Polygon
 from tqdm import tqdm
 
+from city_boundaries import get_city_boundaries
+from geo_distance import get_distances
+from geojson_writer import GeojsonWriter
+from node_index import NodeIndex
+from routing_graph import RoutingGraph
 from tracking_decorator import TrackingDecorator
 
 
-def get_isochrone(logger, graph, start_point, travel_time, distance_attribute="time"):
+class RouteCache:
+    """
+    Least recently used cache of searches by start node, shared by all sample points snapping to the same node. The
+    cache is bounded by the total number of reached nodes it holds, each taking 16 bytes for its index and arrival time
+    """
+
+    def __init__(self, max_num_nodes=1_000_000):
+        self.max_num_nodes = max_num_nodes
+        self.routes = OrderedDict()
+        self.num_nodes = 0
+        self.peak_num_nodes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_reachable_nodes(self, routing_graph, node_index, radius):
+        key = (node_index, radius)
+
+        if key in self.routes:
+            self.hits += 1
+            self.routes.move_to_end(key)
+            return self.routes[key]
+
+        self.misses += 1
+        route = routing_graph.get_reachable_nodes(node_index, radius)
+
+        # Searches larger than the whole cache are not kept
+        if len(route[0]) > self.max_num_nodes:
+            return route
+
+        self.routes[key] = route
+        self.num_nodes += len(route[0])
+
+        while self.num_nodes > self.max_num_nodes:
+            _, (evicted_node_indices, _) = self.routes.popitem(last=False)
+            self.num_nodes -= len(evicted_node_indices)
+
+        self.peak_num_nodes = max(self.peak_num_nodes, self.num_nodes)
+
+        return route
+
+
+def get_isochrones(logger, routing_graph, center_node_index, distance_to_nearest_node, travel_times,
+                   route_cache=None):
     try:
         return get_possible_routes(
-            graph=graph,
-            start_point=start_point,
-            travel_time=travel_time,
-            distance_attribute=distance_attribute,
-            calculate_walking_distance=True
+            routing_graph=routing_graph,
+            center_node_index=center_node_index,
+            distance_to_nearest_node=distance_to_nearest_node,
+            travel_times=travel_times,
+            calculate_walking_distance=True,
+            route_cache=route_cache
         )
     except Exception as e:
         logger.log_line(f"✗️ Exception: {str(e)}")
-        return None, 0
+        return {travel_time: (None, 0) for travel_time in travel_times}
 
 
-def get_isochrone_metrics(logger, data_path, city_id, start_point, subgraph, walking_distance_meters):
-    try:
-        nodes, edges = ox.graph_to_gdfs(subgraph)
+def get_isochrone_metrics(logger, data_path, city_id, start_point, routing_graph, node_indices,
+                          walking_distance_meters):
+    if node_indices is None:
+        return 0, 0, 0, 0, 0
 
-        # Define valid polygons
-        polygon_file = os.path.join(data_path, "cities", city_id, "boundaries", "boundaries.geojson")
-        valid_polygons = get_polygons(read_geojson(polygon_file))
+    try:
+        # Define valid area
+        city_boundaries = get_city_boundaries(data_path, city_id)
 
-        longitudes, latitudes = get_convex_hull(nodes=nodes)
-        points = []
+        longitudes, latitudes = get_convex_hull(
+            longitudes=routing_graph.x[node_indices],
+            latitudes=routing_graph.y[node_indices]
+        )
+        longitudes = np.array(longitudes)
+        latitudes = np.array(latitudes)
 
         # Filter points that are outside city limits
-        for point in zip(longitudes, latitudes):
+        within_city = city_boundaries.contains(longitudes, latitudes)
 
-            p = ogr.Geometry(ogr.wkbPoint)
-            p.AddPoint(point[0], point[1])
+        for longitude, latitude in zip(longitudes[~within_city], latitudes[~within_city]):
+            logger.log_line(f"{city_id} point outside city {longitude}, {latitude}")
 
-            # Check if point is within city limits
-            if is_in_desired_area(p, valid_polygons):
-                points.append([point[0], point[1]])
-            else:
-                logger.log_line(f"{city_id} point outside city {point[0]}, {point[1]}")
+        points = np.column_stack((longitudes[within_city], latitudes[within_city])).tolist()
 
         convex_hull_polygon = Polygon(points)
 
-        transport_distances_meters = get_distances(start_point=start_point, points=points)
+        transport_distances_meters = get_distances(
+            lat=start_point[0],
+            lon=start_point[1],
+            latitudes=latitudes[within_city],
+            longitudes=longitudes[within_city],
+            ellipsoidal=True
+        )
 
         return np.mean(transport_distances_meters) + walking_distance_meters, \
                np.median(transport_distances_meters) + walking_distance_meters, \
@@ -64,130 +118,303 @@ def get_isochrone_metrics(logger, data_path, city_id, start_point, subgraph, wal
         return 0, 0, 0, 0, 0
 
 
-def is_in_desired_area(point, valid_polygons):
-    for polygon in valid_polygons:
-        if point.Within(polygon):
-            return True
+def get_nearest_node_indices(routing_graph, node_index, longitudes, latitudes):
+    # An index built from the routing graph itself yields routing graph indices without a node id lookup
+    if node_index is None:
+        return NodeIndex.from_routing_graph(routing_graph).get_nearest_positions(longitudes, latitudes)
+
+    node_ids, distances = node_index.get_nearest_nodes(longitudes, latitudes)
 
-    return False
+    return np.array([routing_graph.get_node_index(node_id) for node_id in node_ids.tolist()], dtype=np.int64), \
+           distances
+
+
+def get_possible_routes(routing_graph, center_node_index, distance_to_nearest_node, travel_times,
+                        calculate_walking_distance=False, route_cache=None):
+    walking_speed_meters_per_minute = 100
+
+    if calculate_walking_distance:
+        walking_time_minutes = distance_to_nearest_node / walking_speed_meters_per_minute
+    else:
+        walking_time_minutes = 0
 
+    # Search once up to the largest travel time, nodes are returned in order of arrival time
+    max_radius = max(travel_times) - walking_time_minutes
 
-def read_geojson(file_path):
-    file = open(file_path)
-    return json.load(file)
+    if max_radius > 0:
+        if route_cache is not None:
+            # Search without walking offset so that the result can be reused by all points snapping to this node
+            node_indices, arrival_times = route_cache.get_reachable_nodes(routing_graph, center_node_index,
+                                                                          max(travel_times))
+        else:
+            node_indices, arrival_times = routing_graph.get_reachable_nodes(center_node_index, max_radius)
 
+    routes = {}
 
-def get_polygons(geojson):
-    polygons = []
+    for travel_time in travel_times:
+        walking_time_minutes_max = walking_time_minutes if walking_time_minutes < travel_time else travel_time
+        walking_distance_meters = walking_time_minutes_max * walking_speed_meters_per_minute
 
-    # Extract polygons from inhabitants file
-    features = geojson["features"]
+        radius = travel_time - walking_time_minutes
 
-    for feature in features:
-        geom = feature["geometry"]
-        geom = json.dumps(geom)
-        polygon = ogr.CreateGeometryFromJson(geom)
+        if radius > 0:
+            routes[travel_time] = node_indices[:np.searchsorted(arrival_times, radius, side="right")], \
+                                  walking_distance_meters
+        else:
+            routes[travel_time] = None, walking_distance_meters
+
+    return routes
+
+
+def get_convex_hull(longitudes, latitudes):
+    return MultiPoint(np.column_stack((longitudes, latitudes))).convex_hull.exterior.coords.xy
+
+
+def write_points_to_geojson(file_path, coords, travel_time, precision=None, compress=False):
+    with GeojsonWriter(file_path, precision=precision, compress=compress) as writer:
+        for coord in coords:
+            writer.write_feature(
+                geometry={"type": "Point", "coordinates": [coord["lon"], coord["lat"]]},
+                properties={
+                    "mean_spatial_distance_" + str(travel_time) + "min": coord[
+                        "mean_spatial_distance_" + str(travel_time) + "min"],
+                    "median_spatial_distance_" + str(travel_time) + "min": coord[
+                        "median_spatial_distance_" + str(travel_time) + "min"],
+                    "min_spatial_distance_" + str(travel_time) + "min": coord[
+                        "min_spatial_distance_" + str(travel_time) + "min"],
+                    "max_spatial_distance_" + str(travel_time) + "min": coord[
+                        "max_spatial_distance_" + str(travel_time) + "min"],
+                    "area_" + str(travel_time) + "min": coord[
+                        "area_" + str(travel_time) + "min"],
+                }
+            )
 
-        polygons.append(polygon)
 
-    return polygons
+def write_nodes_to_geojson(file_path, longitudes, latitudes, precision=None, compress=False):
+    with GeojsonWriter(file_path, precision=precision, compress=compress) as writer:
+        for longitude, latitude in zip(longitudes, latitudes):
+            writer.write_feature(geometry={"type": "Point", "coordinates": [longitude, latitude]})
 
 
-def get_possible_routes(graph, start_point, travel_time, distance_attribute, calculate_walking_distance=False):
-    center_node, distance_to_nearest_node = ox.nearest_nodes(
-        G=graph,
-        X=start_point[1],
-        Y=start_point[0],
-        return_dist=True
+def write_polygon_to_geojson(file_path, longitudes, latitudes, precision=None, compress=False):
+    coordinates = [[longitude, latitude] for longitude, latitude in zip(longitudes, latitudes)]
+
+    with GeojsonWriter(file_path, precision=precision, compress=compress) as writer:
+        if len(coordinates) > 0:
+            writer.write_feature(geometry={"type": "Polygon", "coordinates": coordinates})
+
+
+def get_point_with_spatial_distance(point, travel_time, mean_spatial_distance, median_spatial_distance,
+                                    min_spatial_distance, max_spatial_distance, area):
+    return {
+        "lon": point["lon"],
+        "lat": point["lat"],
+        "mean_spatial_distance_" + str(travel_time) + "min": mean_spatial_distance,
+        "median_spatial_distance_" + str(travel_time) + "min": median_spatial_distance,
+        "min_spatial_distance_" + str(travel_time) + "min": min_spatial_distance,
+        "max_spatial_distance_" + str(travel_time) + "min": max_spatial_distance,
+        "area_" + str(travel_time) + "min": area
+    }
+
+
+def get_points_with_spatial_distance(logger, data_path, city_id, routing_graph, point, center_node_index,
+                                     distance_to_nearest_node, travel_times, route_cache=None):
+    start_point = (float(point["lat"]), float(point["lon"]))
+
+    # Calculate isochrones for all travel times
+    isochrones = get_isochrones(
+        logger=logger,
+        routing_graph=routing_graph,
+        center_node_index=center_node_index,
+        distance_to_nearest_node=distance_to_nearest_node,
+        travel_times=travel_times,
+        route_cache=route_cache
     )
 
-    if calculate_walking_distance:
-        walking_speed_meters_per_minute = 100
-        walking_time_minutes = distance_to_nearest_node / walking_speed_meters_per_minute
+    points_with_spatial_distance = {}
 
-        walking_time_minutes_max = walking_time_minutes if walking_time_minutes < travel_time else travel_time
-        walking_distance_meters = walking_time_minutes_max * walking_speed_meters_per_minute
+    for travel_time, (node_indices, walking_distance_meters) in isochrones.items():
+        # Determine isochrone metrics
+        mean_spatial_distance, median_spatial_distance, min_spatial_distance, max_spatial_distance, area = get_isochrone_metrics(
+            logger=logger,
+            data_path=data_path,
+            city_id=city_id,
+            start_point=start_point,
+            routing_graph=routing_graph,
+            node_indices=node_indices,
+            walking_distance_meters=walking_distance_meters
+        )
 
-        radius = travel_time - walking_time_minutes
-    else:
-        walking_distance_meters = 0
-        radius = travel_time
+        points_with_spatial_distance[travel_time] = get_point_with_spatial_distance(
+            point=point,
+            travel_time=travel_time,
+            mean_spatial_distance=mean_spatial_distance,
+            median_spatial_distance=median_spatial_distance,
+            min_spatial_distance=min_spatial_distance,
+            max_spatial_distance=max_spatial_distance,
+            area=area
+        ), mean_spatial_distance > 0
+
+    return points_with_spatial_distance
+
+
+def get_chunks(point_indices, chunk_size):
+    return [point_indices[start:start + chunk_size] for start in range(0, len(point_indices), chunk_size)]
 
-    if radius > 0:
-        return nx.ego_graph(graph, center_node, radius=radius, distance=distance_attribute), walking_distance_meters
+
+def get_sample_point_array(sample_points):
+    # Sample points may still be given as a list of dicts with lon and lat
+    if isinstance(sample_points, np.ndarray):
+        return sample_points
     else:
-        return None, walking_distance_meters
+        return np.array([[float(point["lon"]), float(point["lat"])] for point in sample_points],
+                        dtype=np.float64).reshape(-1, 2)
+
+
+def get_sample_point(sample_points, point_index):
+    longitude, latitude = sample_points[point_index].tolist()
+    return {"lon": longitude, "lat": latitude}
+
 
+def get_checkpoint_signature(sample_points, travel_times):
+    # Checkpoints are only valid for the same sample points and travel times
+    signature = hashlib.sha1(json.dumps(list(travel_times)).encode())
+    signature.update(np.ascontiguousarray(sample_points, dtype=np.float64).tobytes())
 
-def get_convex_hull(nodes):
-    return MultiPoint(nodes.reset_index()["geometry"]).convex_hull.exterior.coords.xy
+    return signature.hexdigest()
 
 
-def get_distances(start_point, points):
-    return [geopy.distance.geodesic(point, start_point).meters for point in points]
+def read_checkpoint(file_path, signature):
+    """
+    Reads results of a previous run, a line cut off by a crash is dropped together with everything after it
+    :param file_path: path of the checkpoint file
+    :param signature: signature of the current run
+    :return: dict of results by point index
+    """
+    results = {}
 
+    if not os.path.exists(file_path):
+        return results
 
-def write_points_to_geojson(file_path, coords, travel_time):
-    features = []
-    for coord in coords:
-        feature = {}
-        feature["geometry"] = {"type": "Point", "coordinates": [coord["lon"], coord["lat"]]}
-        feature["type"] = "Feature"
-        feature["properties"] = {
-            "mean_spatial_distance_" + str(travel_time) + "min": coord[
-                "mean_spatial_distance_" + str(travel_time) + "min"],
-            "median_spatial_distance_" + str(travel_time) + "min": coord[
-                "median_spatial_distance_" + str(travel_time) + "min"],
-            "min_spatial_distance_" + str(travel_time) + "min": coord[
-                "min_spatial_distance_" + str(travel_time) + "min"],
-            "max_spatial_distance_" + str(travel_time) + "min": coord[
-                "max_spatial_distance_" + str(travel_time) + "min"],
-            "area_" + str(travel_time) + "min": coord[
-                "area_" + str(travel_time) + "min"],
-        }
-        features.append(feature)
+    valid_length = 0
+
+    with open(file_path, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+
+            if not line.endswith(b"\n"):
+                break
+
+            if "signature" in entry:
+                if entry["signature"] != signature:
+                    results = {}
+                    valid_length = 0
+                    break
+            else:
+                results[entry["index"]] = {travel_time: (point_with_spatial_distance, succeeded)
+                                           for travel_time, point_with_spatial_distance, succeeded in entry["results"]}
 
-    collection = FeatureCollection(features)
+            valid_length += len(line)
 
-    with open(file_path, "w") as f:
-        f.write("%s" % collection)
+    # Remove incomplete or outdated lines so that new results can be appended
+    with open(file_path, "r+b") as f:
+        f.truncate(valid_length)
 
+    return results
 
-def write_nodes_to_geojson(file_path, graph):
-    features = []
 
-    if len(graph.nodes) > 0:
-        for node_id in graph.nodes:
-            node = graph.nodes[node_id]
-            feature = {}
-            feature["geometry"] = {"type": "Point", "coordinates": [node["x"], node["y"]]}
-            feature["type"] = "Feature"
-            features.append(feature)
+def append_checkpoint(file_path, signature, results):
+    new_file = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
 
-    collection = FeatureCollection(features)
+    with open(file_path, "a") as f:
+        if new_file:
+            f.write(json.dumps({"signature": signature}) + "\n")
 
-    with open(file_path, "w") as f:
-        f.write("%s" % collection)
+        for point_index, points_with_spatial_distance in results:
+            f.write(json.dumps({
+                "index": point_index,
+                "results": [[travel_time, point_with_spatial_distance, bool(succeeded)]
+                            for travel_time, (point_with_spatial_distance, succeeded)
+                            in points_with_spatial_distance.items()]
+            }) + "\n")
 
+        f.flush()
+        os.fsync(f.fileno())
 
-def write_polygon_to_geojson(file_path, graph):
-    features = []
-    coordinates = []
 
-    for node_id in graph.nodes:
-        node = graph.nodes[node_id]
-        coordinates.append([node["x"], node["y"]])
+def build_isochrones_in_series(logger, data_path, city_id, routing_graph, sample_points, center_node_indices,
+                               distances_to_nearest_node, travel_times, route_cache, point_indices):
+    for point_index in tqdm(iterable=point_indices, total=len(point_indices), desc="Build isochrone", unit="point"):
+        yield point_index, get_points_with_spatial_distance(
+            logger=logger,
+            data_path=data_path,
+            city_id=city_id,
+            routing_graph=routing_graph,
+            point=get_sample_point(sample_points, point_index),
+            center_node_index=center_node_indices[point_index],
+            distance_to_nearest_node=distances_to_nearest_node[point_index],
+            travel_times=travel_times,
+            route_cache=route_cache
+        )
 
-    if len(graph.nodes) > 0:
-        feature = {}
-        feature["geometry"] = {"type": "Polygon", "coordinates": coordinates}
-        feature["type"] = "Feature"
-        features.append(feature)
 
-    collection = FeatureCollection(features)
+# State shared with worker processes, set before the pool is forked so that the routing graph is shared copy-on-write
+# or, if it is memory-mapped, through the same file pages
+worker_state = {}
+
+
+def build_isochrones_for_chunk(chunk):
+    # Each worker process has its own copy of the route cache
+    route_cache = worker_state["route_cache"]
+    hits, misses = route_cache.hits, route_cache.misses
+
+    chunk_results = [(point_index, get_points_with_spatial_distance(
+        logger=worker_state["logger"],
+        data_path=worker_state["data_path"],
+        city_id=worker_state["city_id"],
+        routing_graph=worker_state["routing_graph"],
+        point=get_sample_point(worker_state["sample_points"], point_index),
+        center_node_index=worker_state["center_node_indices"][point_index],
+        distance_to_nearest_node=worker_state["distances_to_nearest_node"][point_index],
+        travel_times=worker_state["travel_times"],
+        route_cache=route_cache
+    )) for point_index in chunk]
+
+    return chunk_results, route_cache.hits - hits, route_cache.misses - misses, route_cache.peak_num_nodes
+
+
+def build_isochrones_in_parallel(logger, data_path, city_id, routing_graph, sample_points, center_node_indices,
+                                 distances_to_nearest_node, travel_times, route_cache, point_indices, processes,
+                                 chunk_size):
+    worker_state.update({
+        "logger": logger,
+        "data_path": data_path,
+        "city_id": city_id,
+        "routing_graph": routing_graph,
+        "sample_points": sample_points,
+        "center_node_indices": center_node_indices,
+        "distances_to_nearest_node": distances_to_nearest_node,
+        "travel_times": travel_times,
+        "route_cache": route_cache
+    })
+
+    chunks = get_chunks(point_indices, chunk_size)
 
-    with open(file_path, "w") as f:
-        f.write("%s" % collection)
+    try:
+        with multiprocessing.get_context("fork").Pool(processes=processes) as pool, \
+                tqdm(total=len(point_indices), desc="Build isochrone", unit="point") as progress_bar:
+            # Use ordered map so that results are merged in the order of the sample points
+            for chunk_results, hits, misses, peak_num_nodes in pool.imap(build_isochrones_for_chunk, chunks):
+                route_cache.hits += hits
+                route_cache.misses += misses
+                route_cache.peak_num_nodes = max(route_cache.peak_num_nodes, peak_num_nodes)
+                progress_bar.update(len(chunk_results))
+                yield from chunk_results
+    finally:
+        worker_state.clear()
 
 
 #
@@ -196,67 +423,161 @@ def write_polygon_to_geojson(file_path, graph):
 
 class IsochroneBuilder:
 
-    @TrackingDecorator.track_time
-    def run(self, logger, data_path, results_path, city_id, graph, sample_points, travel_time, start_time, end_time):
-        points_with_spatial_distance = []
-        failed_points = []
+    def run(self, logger, data_path, results_path, city_id, graph, sample_points, travel_time, start_time, end_time,
+            routing_graph=None, node_index=None, processes=1, chunk_size=None, route_cache_max_nodes=1_000_000,
+            checkpoint_interval=1000, clean=False):
+        return self.run_for_travel_times(
+            logger=logger,
+            data_path=data_path,
+            results_path=results_path,
+            city_id=city_id,
+            graph=graph,
+            sample_points=sample_points,
+            travel_times=[travel_time],
+            start_time=start_time,
+            end_time=end_time,
+            routing_graph=routing_graph,
+            node_index=node_index,
+            processes=processes,
+            chunk_size=chunk_size,
+            route_cache_max_nodes=route_cache_max_nodes,
+            checkpoint_interval=checkpoint_interval,
+            clean=clean
+        )[travel_time]
 
+    @TrackingDecorator.track_time
+    def run_for_travel_times(self, logger, data_path, results_path, city_id, graph, sample_points, travel_times,
+                             start_time, end_time, routing_graph=None, node_index=None, processes=1, chunk_size=None,
+                             route_cache_max_nodes=1_000_000, checkpoint_interval=1000, clean=False):
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
-        for point_index in tqdm(iterable=range(len(sample_points)),
-                                total=len(sample_points),
-                                desc="Build isochrone",
-                                unit="point"):
-            point = sample_points[point_index]
-            start_point = (float(point["lat"]), float(point["lon"]))
+        # Sample points are an array of longitudes and latitudes
+        sample_points = get_sample_point_array(sample_points)
+
+        # Build routing graph once for all sample points unless a memory-mapped one is passed
+        if routing_graph is None:
+            routing_graph = RoutingGraph.from_graph(graph)
+
+        # Load city boundaries once for all sample points
+        get_city_boundaries(data_path, city_id)
+
+        # Snap all sample points to their nearest nodes at once
+        center_node_indices, distances_to_nearest_node = get_nearest_node_indices(
+            routing_graph=routing_graph,
+            node_index=node_index,
+            longitudes=sample_points[:, 0],
+            latitudes=sample_points[:, 1]
+        )
 
-            # Calculate isochrone
-            subgraph, walking_distance_meters = get_isochrone(
+        # Cache searches of sample points that snap to the same node, valid for this graph and these travel times
+        route_cache = RouteCache(max_num_nodes=route_cache_max_nodes)
+
+        # Resume from results of an interrupted run
+        checkpoint_file_path = os.path.join(results_path, f"isochrones-{start_time}-{end_time}.checkpoint.jsonl")
+        checkpoint_signature = get_checkpoint_signature(sample_points, travel_times)
+
+        if clean and os.path.exists(checkpoint_file_path):
+            os.remove(checkpoint_file_path)
+
+        completed_results = read_checkpoint(checkpoint_file_path, checkpoint_signature)
+        point_indices = [point_index for point_index in range(len(sample_points))
+                         if point_index not in completed_results]
+
+        if len(completed_results) > 0:
+            logger.log_line(f"✓ Resume from {checkpoint_file_path} with {len(completed_results)} completed points")
+
+        if processes > 1:
+            # Split points so that each process gets several chunks to balance uneven workloads
+            if chunk_size is None:
+                chunk_size = max(1, math.ceil(len(point_indices) / (processes * 16)))
+
+            pending_results = build_isochrones_in_parallel(
                 logger=logger,
-                graph=graph,
-                start_point=start_point,
-                travel_time=travel_time
+                data_path=data_path,
+                city_id=city_id,
+                routing_graph=routing_graph,
+                sample_points=sample_points,
+                center_node_indices=center_node_indices,
+                distances_to_nearest_node=distances_to_nearest_node,
+                travel_times=travel_times,
+                route_cache=route_cache,
+                point_indices=point_indices,
+                processes=processes,
+                chunk_size=chunk_size
             )
-
-            # Determine isochrone metrics
-            mean_spatial_distance, median_spatial_distance, min_spatial_distance, max_spatial_distance, area = get_isochrone_metrics(
+        else:
+            pending_results = build_isochrones_in_series(
                 logger=logger,
                 data_path=data_path,
                 city_id=city_id,
-                start_point=start_point,
-                subgraph=subgraph,
-                walking_distance_meters=walking_distance_meters
+                routing_graph=routing_graph,
+                sample_points=sample_points,
+                center_node_indices=center_node_indices,
+                distances_to_nearest_node=distances_to_nearest_node,
+                travel_times=travel_times,
+                route_cache=route_cache,
+                point_indices=point_indices
             )
 
-            point_with_spatial_distance = {
-                "lon": point["lon"],
-                "lat": point["lat"],
-                "mean_spatial_distance_" + str(travel_time) + "min": mean_spatial_distance,
-                "median_spatial_distance_" + str(travel_time) + "min": median_spatial_distance,
-                "min_spatial_distance_" + str(travel_time) + "min": min_spatial_distance,
-                "max_spatial_distance_" + str(travel_time) + "min": max_spatial_distance,
-                "area_" + str(travel_time) + "min": area
-            }
-
-            if mean_spatial_distance > 0:
-                points_with_spatial_distance.append(point_with_spatial_distance)
-            else:
-                failed_points.append(point_with_spatial_distance)
+        # Append results to checkpoint periodically
+        checkpoint_results = []
 
-        write_points_to_geojson(
-            file_path=os.path.join(results_path, f"isochrones-{str(travel_time)}min-{start_time}-{end_time}.geojson"),
-            coords=points_with_spatial_distance,
-            travel_time=travel_time
-        )
+        for point_index, points_with_spatial_distance in pending_results:
+            completed_results[point_index] = points_with_spatial_distance
+            checkpoint_results.append((point_index, points_with_spatial_distance))
 
-        write_points_to_geojson(
-            file_path=os.path.join(results_path, f"isochrones-{str(travel_time)}min-{start_time}-{end_time}-failed.geojson"),
-            coords=failed_points,
-            travel_time=travel_time
-        )
+            if len(checkpoint_results) >= checkpoint_interval:
+                append_checkpoint(checkpoint_file_path, checkpoint_signature, checkpoint_results)
+                checkpoint_results = []
 
-        return points_with_spatial_distance, failed_points
+        if len(checkpoint_results) > 0:
+            append_checkpoint(checkpoint_file_path, checkpoint_signature, checkpoint_results)
+
+        results = [completed_results[point_index] for point_index in range(len(sample_points))]
+
+        logger.log_line(f"✓ Route cache: {route_cache.hits} hits, {route_cache.misses} misses, peak of "
+                        f"{route_cache.peak_num_nodes} nodes ({route_cache.peak_num_nodes * 16 / 1_000_000:.1f} MB) "
+                        f"per process")
+
+        isochrones = {}
+
+        for travel_time in travel_times:
+            points_with_spatial_distance = []
+            failed_points = []
+
+            for result in results:
+                point_with_spatial_distance, succeeded = result[travel_time]
+
+                if succeeded:
+                    points_with_spatial_distance.append(point_with_spatial_distance)
+                else:
+                    failed_points.append(point_with_spatial_distance)
+
+            write_points_to_geojson(
+                file_path=os.path.join(results_path,
+                                       f"isochrones-{str(travel_time)}min-{start_time}-{end_time}.geojson"),
+                coords=points_with_spatial_distance,
+                travel_time=travel_time
+            )
+
+            write_points_to_geojson(
+                file_path=os.path.join(results_path,
+                                       f"isochrones-{str(travel_time)}min-{start_time}-{end_time}-failed.geojson"),
+                coords=failed_points,
+                travel_time=travel_time
+            )
+
+            logger.log_line(f"✓ Build {len(points_with_spatial_distance)} isochrones for {str(travel_time)}min "
+                            f"({len(failed_points)} failed) with {processes} process(es)")
+
+            isochrones[travel_time] = points_with_spatial_distance, failed_points
+
+        # Remove checkpoint once all output files are written
+        if os.path.exists(checkpoint_file_path):
+            os.remove(checkpoint_file_path)
+
+        return isochrones
 
     @TrackingDecorator.track_time
     def run_for_place(self, logger, data_path, results_path, city_id, graph, travel_time, place):
@@ -267,13 +588,25 @@ class IsochroneBuilder:
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
+        # Build routing graph
+        routing_graph = RoutingGraph.from_graph(graph)
+
+        # Snap place to nearest node
+        center_node_indices, distances_to_nearest_node = get_nearest_node_indices(
+            routing_graph=routing_graph,
+            node_index=None,
+            longitudes=[start_point[1]],
+            latitudes=[start_point[0]]
+        )
+
         # Calculate isochrone
-        subgraph, walking_distance_meters = get_isochrone(
+        node_indices, walking_distance_meters = get_isochrones(
             logger=logger,
-            graph=graph,
-            start_point=start_point,
-            travel_time=travel_time
-        )
+            routing_graph=routing_graph,
+            center_node_index=center_node_indices[0],
+            distance_to_nearest_node=distances_to_nearest_node[0],
+            travel_times=[travel_time]
+        )[travel_time]
 
         # Determine isochrone metrics
         mean_spatial_distance, median_spatial_distance, min_spatial_distance, max_spatial_distance, area = get_isochrone_metrics(
@@ -281,22 +614,28 @@ class IsochroneBuilder:
             data_path=data_path,
             city_id=city_id,
             start_point=start_point,
-            subgraph=subgraph,
+            routing_graph=routing_graph,
+            node_indices=node_indices,
             walking_distance_meters=walking_distance_meters
         )
 
-        write_nodes_to_geojson(file_path=os.path.join(results_path, "isochrone-nodes-" + str(travel_time) + ".geojson"), graph=subgraph)
-        write_polygon_to_geojson(file_path=os.path.join(results_path, "isochrone-hull-" + str(travel_time) + ".geojson"), graph=subgraph)
-
-        point_with_spatial_distance = {
-            "lon": start_point[1],
-            "lat": start_point[0],
-            "mean_spatial_distance_" + str(travel_time) + "min": mean_spatial_distance,
-            "median_spatial_distance_" + str(travel_time) + "min": median_spatial_distance,
-            "min_spatial_distance_" + str(travel_time) + "min": min_spatial_distance,
-            "max_spatial_distance_" + str(travel_time) + "min": max_spatial_distance,
-            "area_" + str(travel_time) + "min": area
-        }
+        if node_indices is None:
+            node_indices = np.array([], dtype=np.int64)
+
+        write_nodes_to_geojson(file_path=os.path.join(results_path, "isochrone-nodes-" + str(travel_time) + ".geojson"),
+                               longitudes=routing_graph.x[node_indices], latitudes=routing_graph.y[node_indices])
+        write_polygon_to_geojson(file_path=os.path.join(results_path, "isochrone-hull-" + str(travel_time) + ".geojson"),
+                                 longitudes=routing_graph.x[node_indices], latitudes=routing_graph.y[node_indices])
+
+        point_with_spatial_distance = get_point_with_spatial_distance(
+            point={"lon": start_point[1], "lat": start_point[0]},
+            travel_time=travel_time,
+            mean_spatial_distance=mean_spatial_distance,
+            median_spatial_distance=median_spatial_distance,
+            min_spatial_distance=min_spatial_distance,
+            max_spatial_distance=max_spatial_distance,
+            area=area
+        )
 
         if mean_spatial_distance > 0:
             points_with_spatial_distance.append(point_with_spatial_distance)
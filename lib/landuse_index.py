@@ -0,0 +1,156 @@
+import json
+import os
+
+import numpy as np
+from shapely import vectorized, wkb
+from shapely.geometry import box
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+from byte_array import decode_byte_strings, encode_byte_strings
+from city_boundaries import get_polygons, read_geojson
+from tracking_decorator import TrackingDecorator
+
+# Land use in which no sample points are placed
+INVALID_LANDUSE_FILE_NAMES = ["cemetery.geojson", "farmland.geojson", "farmyard.geojson", "forest.geojson",
+                              "garden.geojson", "park.geojson", "recreation_ground.geojson", "water.geojson",
+                              "wood.geojson"]
+
+
+def get_landuse_file_paths(data_path, city_id):
+    file_paths = [os.path.join(data_path, "cities", city_id, "landuse", file_name)
+                  for file_name in INVALID_LANDUSE_FILE_NAMES]
+
+    return [file_path for file_path in file_paths if os.path.exists(file_path)]
+
+
+def get_file_signature(file_paths):
+    # Cache is outdated as soon as an input file is added, removed or changed
+    return [[os.path.basename(file_path), os.path.getsize(file_path), os.path.getmtime(file_path)]
+            for file_path in file_paths]
+
+
+def save_landuse_polygons(file_path, polygons, signature):
+    # Polygons are stored as WKB in one byte buffer so that rows are not padded to the largest polygon
+    polygon_data, polygon_offsets = encode_byte_strings([polygon.wkb for polygon in polygons])
+
+    temporary_file_path = file_path + ".tmp.npz"
+    np.savez_compressed(
+        temporary_file_path,
+        polygon_data=polygon_data,
+        polygon_offsets=polygon_offsets,
+        signature=np.array(json.dumps(signature))
+    )
+    os.replace(temporary_file_path, file_path)
+
+
+def load_landuse_polygons(file_path, signature):
+    if not os.path.exists(file_path):
+        return None
+
+    with np.load(file_path, allow_pickle=False) as arrays:
+        # Caches written before polygons were stored as byte buffers are rebuilt
+        if "polygon_data" not in arrays or json.loads(arrays["signature"].item()) != signature:
+            return None
+
+        return [wkb.loads(polygon) for polygon in decode_byte_strings(arrays["polygon_data"],
+                                                                       arrays["polygon_offsets"])]
+
+
+def get_grid_cells(longitudes, latitudes, grid_size):
+    xmin, xmax = longitudes.min(), longitudes.max()
+    ymin, ymax = latitudes.min(), latitudes.max()
+
+    columns = np.minimum(((longitudes - xmin) / max(xmax - xmin, 1e-12) * grid_size).astype(np.int64), grid_size - 1)
+    rows = np.minimum(((latitudes - ymin) / max(ymax - ymin, 1e-12) * grid_size).astype(np.int64), grid_size - 1)
+
+    return rows * grid_size + columns
+
+
+#
+# Main
+#
+
+class LanduseIndex:
+    """
+    R-tree over invalid land use polygons so that points are only tested against polygons whose bounding boxes
+    contain them
+    """
+
+    def __init__(self, polygons):
+        self.polygons = polygons
+        self.prepared_polygons = [prep(polygon) for polygon in polygons]
+        self.bounds = [polygon.bounds for polygon in polygons]
+        self.tree = STRtree(polygons, list(range(len(polygons)))) if len(polygons) > 0 else None
+
+    def contains(self, longitudes, latitudes, grid_size=16):
+        """
+        Tests which points lie within any of the polygons
+        :param longitudes: array of longitudes
+        :param latitudes: array of latitudes
+        :param grid_size: number of grid columns and rows used to query the tree for groups of nearby points
+        :return: boolean array
+        """
+        contained = np.zeros(len(longitudes), dtype=bool)
+
+        if self.tree is None or len(longitudes) == 0:
+            return contained
+
+        # Group points by grid cell so that the tree is queried once per cell instead of once per point
+        cells = get_grid_cells(longitudes, latitudes, grid_size)
+        order = np.argsort(cells, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(cells[order]) != 0])
+        ends = np.r_[starts[1:], len(order)]
+
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            cell_indices = order[start:end]
+            cell_longitudes = longitudes[cell_indices]
+            cell_latitudes = latitudes[cell_indices]
+            cell_box = box(cell_longitudes.min(), cell_latitudes.min(), cell_longitudes.max(), cell_latitudes.max())
+
+            for polygon_index in self.tree.query_items(cell_box):
+                xmin, ymin, xmax, ymax = self.bounds[polygon_index]
+
+                # Only test points whose coordinates lie within the bounding box of the polygon
+                candidates = ~contained[cell_indices] & (cell_longitudes >= xmin) & (cell_longitudes <= xmax) & \
+                             (cell_latitudes >= ymin) & (cell_latitudes <= ymax)
+
+                if np.any(candidates):
+                    contained[cell_indices[candidates]] = vectorized.contains(self.prepared_polygons[polygon_index],
+                                                                              cell_longitudes[candidates],
+                                                                              cell_latitudes[candidates])
+
+        return contained
+
+
+class LanduseIndexBuilder:
+
+    @TrackingDecorator.track_time
+    def run(self, logger, data_path, results_path, city_id, clean=False, quiet=False):
+        # Make results path
+        os.makedirs(os.path.join(results_path), exist_ok=True)
+
+        # Define file path
+        file_path = os.path.join(results_path, "invalid-landuse.npz")
+
+        file_paths = get_landuse_file_paths(data_path, city_id)
+        signature = get_file_signature(file_paths)
+
+        # Check if result needs to be generated
+        polygons = None if clean else load_landuse_polygons(file_path, signature)
+
+        if polygons is None:
+            polygons = []
+            for landuse_file_path in file_paths:
+                polygons += get_polygons(read_geojson(landuse_file_path))
+
+            # Save polygons
+            save_landuse_polygons(file_path, polygons, signature)
+
+            if not quiet:
+                logger.log_line(f"✓ Build {file_path} with {len(polygons)} polygons")
+        else:
+            if not quiet:
+                logger.log_line(f"✓ Load {file_path} with {len(polygons)} polygons")
+
+        return LanduseIndex(polygons)
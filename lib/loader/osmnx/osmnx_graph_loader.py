@@ -4,16 +4,18 @@ from operator import is_not
 
 import networkx as nx
 import osmnx as ox
+from graph_store import GRAPH_FILE_EXTENSION, graph_exists, load_graph, save_graph
 from tracking_decorator import TrackingDecorator
 
 
-def download_transport_graph(logger, results_path, query, transport, simplify=False, enhance_with_speed=False):
+def download_transport_graph(logger, results_path, query, transport, simplify=False, enhance_with_speed=False,
+                             export_graphml=False):
     graph_transport = None
 
     if simplify:
-        file_path = os.path.join(results_path, transport + "-simplified.graphml")
+        file_path = os.path.join(results_path, transport + "-simplified" + GRAPH_FILE_EXTENSION)
     else:
-        file_path = os.path.join(results_path, transport + "-unsimplified.graphml")
+        file_path = os.path.join(results_path, transport + "-unsimplified" + GRAPH_FILE_EXTENSION)
 
     try:
         if transport == "all":
@@ -68,7 +70,7 @@ def download_transport_graph(logger, results_path, query, transport, simplify=Fa
             graph_transport = enhance_graph_with_speed(graph=graph_transport, transport=transport)
 
         # Save graph
-        ox.save_graphml(graph_transport, file_path)
+        save_graph(graph_transport, file_path, export_graphml=export_graphml)
 
         return graph_transport
     except Exception as e:
@@ -127,7 +129,7 @@ def enhance_graph_with_speed(graph, time_attribute="time", transport=None):
 
 
 def load_transport_graph(file_path):
-    return ox.load_graphml(file_path)
+    return load_graph(file_path)
 
 
 import warnings
@@ -142,19 +144,19 @@ warnings.filterwarnings("ignore")
 class OsmnxGraphLoader:
 
     @TrackingDecorator.track_time
-    def run(self, logger, results_path, query, transport, simplify=False, enhance_with_speed=False, clean=False,
-            quiet=False):
+    def run(self, logger, results_path, query, transport, simplify=False, enhance_with_speed=False,
+            export_graphml=False, clean=False, quiet=False):
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
         # Define file path
         if simplify:
-            file_path = os.path.join(results_path, transport + "-simplified.graphml")
+            file_path = os.path.join(results_path, transport + "-simplified" + GRAPH_FILE_EXTENSION)
         else:
-            file_path = os.path.join(results_path, transport + "-unsimplified.graphml")
+            file_path = os.path.join(results_path, transport + "-unsimplified" + GRAPH_FILE_EXTENSION)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not graph_exists(file_path):
 
             # Download graph
             graph = download_transport_graph(
@@ -164,6 +166,7 @@ class OsmnxGraphLoader:
                 transport=transport,
                 simplify=simplify,
                 enhance_with_speed=enhance_with_speed,
+                export_graphml=export_graphml
             )
 
             if not quiet:
@@ -4,12 +4,13 @@ from operator import is_not
 
 import networkx as nx
 import osmnx as ox
+from graph_store import GRAPH_FILE_EXTENSION, graph_exists, load_graph, save_graph
 from tracking_decorator import TrackingDecorator
 
 
-def download_transport_graph(logger, results_path, city, transport):
+def download_transport_graph(logger, results_path, city, transport, export_graphml=False):
     graph_transport = None
-    file_path = os.path.join(results_path, transport + ".graphml")
+    file_path = os.path.join(results_path, transport + GRAPH_FILE_EXTENSION)
 
     try:
         if transport == "all":
@@ -38,7 +39,7 @@ def download_transport_graph(logger, results_path, city, transport):
             )
 
         # Save graph
-        ox.save_graphml(graph_transport, file_path)
+        save_graph(graph_transport, file_path, export_graphml=export_graphml)
 
         return graph_transport
     except Exception as e:
@@ -77,7 +78,7 @@ def download_complete_graph(logger, city, results_path):
 
 
 def load_transport_graph(file_path):
-    return ox.load_graphml(file_path)
+    return load_graph(file_path)
 
 
 import warnings
@@ -92,22 +93,23 @@ warnings.filterwarnings("ignore")
 class OsmnxStationLoader:
 
     @TrackingDecorator.track_time
-    def run(self, logger, results_path, city, transport, clean=False, quiet=False):
+    def run(self, logger, results_path, city, transport, export_graphml=False, clean=False, quiet=False):
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
         # Define file path
-        file_path = os.path.join(results_path, transport + ".graphml")
+        file_path = os.path.join(results_path, transport + GRAPH_FILE_EXTENSION)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not graph_exists(file_path):
 
             # Download graph
             graph = download_transport_graph(
                 logger=logger,
                 results_path=results_path,
                 city=city,
-                transport=transport
+                transport=transport,
+                export_graphml=export_graphml
             )
 
             if not quiet:
@@ -0,0 +1,270 @@
+import glob
+import math
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from overpass_cache import DEFAULT_TTL, OverpassCache
+from overpass_client import RETRY_STATUS_CODES, get_overpass_client
+from overpass_json import OverpassElementsWriter, get_remark, get_temporary_file_path, iterate_elements
+from requests.exceptions import ChunkedEncodingError, ConnectionError as RequestConnectionError, HTTPError, Timeout
+
+# Statements the batching layer can evaluate locally, e.g. node["railway"~"station|halt"]["subway"="yes"]
+STATEMENT_PATTERN = re.compile(r"^\s*(node|way|relation)((?:\[[^\]]*\])*)\s*$")
+TAG_FILTER_PATTERN = re.compile(r"\[\s*(!?)\"([^\"]*)\"\s*(?:(!?[=~])\s*\"([^\"]*)\")?\s*\]")
+
+# Timeout of a single statement in seconds and upper bound for a batch of statements
+STATEMENT_TIMEOUT = 25
+MAX_BATCH_TIMEOUT = 180
+
+# Typical number of elements per square kilometer matched by a statement, used to size tiles before a first download
+ELEMENT_DENSITIES = {"node": 10, "way": 50, "relation": 1}
+
+# Number of elements a tile should not exceed and number of times a failing tile is split into quarters
+MAX_ELEMENTS_PER_TILE = 20_000
+MAX_SPLIT_DEPTH = 3
+
+
+class OverpassQueryError(Exception):
+    pass
+
+
+def get_bbox(bounding_box):
+    return f"({bounding_box[1]}, {bounding_box[0]}, {bounding_box[3]}, {bounding_box[2]})"
+
+
+def get_union_query(queries, bounding_box):
+    """
+    Combines statements into a single union query over a bounding box
+    :param queries: list of statements without bounding box, e.g. node["highway"="bus_stop"]
+    :param bounding_box: bounding box as [west, south, east, north]
+    :return: query in Overpass QL
+    """
+    bbox = get_bbox(bounding_box)
+    timeout = min(STATEMENT_TIMEOUT * len(queries), MAX_BATCH_TIMEOUT)
+    statements = "\n".join(f"  {query}{bbox};" for query in queries)
+
+    return f"[out:json][timeout:{timeout}];\n(\n{statements}\n);\nout geom;\n"
+
+
+def parse_query(query):
+    """
+    Parses a statement into its element type and tag filters
+    :param query: statement without bounding box
+    :return: element type and list of tag filters as (negated, key, operator, value)
+    """
+    match = STATEMENT_PATTERN.match(query)
+
+    if match is None:
+        raise ValueError(f"Unsupported query {query}")
+
+    element_type, filters = match.groups()
+
+    if TAG_FILTER_PATTERN.sub("", filters) != "":
+        raise ValueError(f"Unsupported tag filter in query {query}")
+
+    return element_type, TAG_FILTER_PATTERN.findall(filters)
+
+
+def matches_query(element, parsed_query):
+    element_type, tag_filters = parsed_query
+
+    if element["type"] != element_type:
+        return False
+
+    tags = element.get("tags", {})
+
+    for negated, key, operator, value in tag_filters:
+        if operator == "":
+            # Filters like ["key"] and [!"key"] only test whether a tag exists
+            if (key in tags) == (negated == "!"):
+                return False
+        elif operator == "=":
+            if tags.get(key) != value:
+                return False
+        elif operator == "!=":
+            if tags.get(key) == value:
+                return False
+        elif operator == "~":
+            if key not in tags or re.search(value, tags[key]) is None:
+                return False
+        elif operator == "!~":
+            if key in tags and re.search(value, tags[key]) is not None:
+                return False
+
+    return True
+
+
+def get_area(bounding_box):
+    # Area in square kilometers, precise enough to size tiles
+    west, south, east, north = bounding_box
+    return (east - west) * 111.32 * math.cos(math.radians((south + north) / 2)) * (north - south) * 110.57
+
+
+def get_expected_num_elements(requests):
+    """
+    Estimates the number of elements of a batch, from earlier downloads where available and from typical densities
+    otherwise
+    :param requests: list of requests sharing a bounding box
+    :return: expected number of elements
+    """
+    num_elements = 0
+
+    for cache_path, query in dict.fromkeys((request["cache_path"], request["query"]) for request in requests):
+        metadata = OverpassCache(cache_path).get_metadata(query, requests[0]["bounding_box"])
+
+        if metadata is not None:
+            num_elements += metadata["num_elements"]
+        else:
+            element_type, _ = parse_query(query)
+            num_elements += ELEMENT_DENSITIES[element_type] * get_area(requests[0]["bounding_box"])
+
+    return num_elements
+
+
+def get_tiles(bounding_box, num_tiles_per_side):
+    west, south, east, north = bounding_box
+    width = (east - west) / num_tiles_per_side
+    height = (north - south) / num_tiles_per_side
+
+    return [[round(west + column * width, 7), round(south + row * height, 7),
+             round(west + (column + 1) * width, 7), round(south + (row + 1) * height, 7)]
+            for row in range(num_tiles_per_side) for column in range(num_tiles_per_side)]
+
+
+def is_split_worthwhile(exception):
+    # Smaller tiles help against timeouts and overload, but not against malformed queries
+    if isinstance(exception, HTTPError):
+        return exception.response is not None and exception.response.status_code in RETRY_STATUS_CODES
+
+    return isinstance(exception, (OverpassQueryError, Timeout, RequestConnectionError, ChunkedEncodingError))
+
+
+def download_tile(queries, tile, file_path, depth=0):
+    """
+    Downloads the elements of a tile, splitting it into quarters whenever it fails in a way smaller tiles can avoid
+    :param queries: list of statements without bounding box
+    :param tile: bounding box of the tile
+    :param file_path: file path to download to, quarters append their index
+    :param depth: number of times the tile has been split
+    :return: list of file paths of the downloaded tiles
+    """
+    try:
+        get_overpass_client().download(get_union_query(queries, tile), file_path)
+        remark = get_remark(file_path)
+
+        if remark is not None and "runtime error" in remark:
+            raise OverpassQueryError(remark)
+
+        return [file_path]
+    except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        if depth >= MAX_SPLIT_DEPTH or not is_split_worthwhile(e):
+            raise
+
+        return [tile_file_path
+                for index, quarter in enumerate(get_tiles(tile, 2))
+                for tile_file_path in download_tile(queries, quarter, f"{file_path}.{index}", depth + 1)]
+
+
+def split_elements(file_paths, requests):
+    """
+    Splits the responses of a union query into the cache entries of its requests in a single pass. Since all
+    statements share the same bounding box, an element belongs to a request exactly if its type and tags match the
+    request's statement. Elements contained in several tiles are only written once
+    :param file_paths: file paths of the responses of a union query, one per tile
+    :param requests: list of requests with a file name, a cache path, a bounding box and a query
+    :return: dictionary of cache path and query to number of elements
+    """
+    entries = {}
+
+    for request in requests:
+        entries.setdefault((request["cache_path"], request["query"]), []).append(request)
+
+    with ExitStack() as stack:
+        writers = {
+            (cache_path, query): (
+                stack.enter_context(OverpassElementsWriter(
+                    OverpassCache(cache_path).get_file_path(query, entry_requests[0]["bounding_box"]))),
+                parse_query(query)
+            )
+            for (cache_path, query), entry_requests in entries.items()
+        }
+
+        written_elements = set()
+
+        for file_path in file_paths:
+            for element in iterate_elements(file_path):
+                if (element["type"], element["id"]) in written_elements:
+                    continue
+
+                written_elements.add((element["type"], element["id"]))
+
+                for writer, parsed_query in writers.values():
+                    if matches_query(element, parsed_query):
+                        writer.write_element(element)
+
+    for (cache_path, query), entry_requests in entries.items():
+        writer, _ = writers[(cache_path, query)]
+
+        OverpassCache(cache_path).write_metadata(
+            names=[request["file_name"] for request in entry_requests],
+            query=query,
+            bounding_box=entry_requests[0]["bounding_box"],
+            num_elements=writer.num_elements,
+            ttl=entry_requests[0].get("ttl", DEFAULT_TTL)
+        )
+
+    return {entry: writer.num_elements for entry, (writer, _) in writers.items()}
+
+
+def fetch_batch(requests, max_workers=2):
+    """
+    Downloads requests sharing a bounding box with union queries and stores each request's elements in its cache.
+    Identical statements are only sent once. The bounding box is split into tiles sized by the expected number of
+    elements, which are downloaded concurrently and split further if they still fail
+    :param requests: list of requests with a name, a file name, a cache path, a bounding box and a query
+    :param max_workers: number of tiles to download concurrently
+    :return: list of (request, succeeded, error) and latency in seconds
+    """
+    start_time = time.monotonic()
+    queries = list(dict.fromkeys(request["query"] for request in requests))
+    num_tiles_per_side = max(1, math.ceil(math.sqrt(get_expected_num_elements(requests) / MAX_ELEMENTS_PER_TILE)))
+    tiles = get_tiles(requests[0]["bounding_box"], num_tiles_per_side)
+    temporary_file_path = get_temporary_file_path(os.path.join(requests[0]["cache_path"], "batch.json"))
+
+    try:
+        os.makedirs(requests[0]["cache_path"], exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(download_tile, queries, tile, f"{temporary_file_path}.{index}")
+                       for index, tile in enumerate(tiles)]
+            tile_file_paths = [tile_file_path for future in futures for tile_file_path in future.result()]
+
+        split_elements(tile_file_paths, requests)
+    except Exception as e:
+        return [(request, False, str(e)) for request in requests], time.monotonic() - start_time
+    finally:
+        for tile_file_path in glob.glob(glob.escape(temporary_file_path) + ".*"):
+            os.remove(tile_file_path)
+
+    # Requests without elements succeed as well, their empty responses are cached
+    return [(request, True, None) for request in requests], time.monotonic() - start_time
+
+
+def get_batches(requests):
+    """
+    Groups requests by bounding box
+    :param requests: list of requests with a bounding box
+    :return: list of lists of requests
+    """
+    batches = {}
+
+    for request in requests:
+        batches.setdefault(tuple(request["bounding_box"]), []).append(request)
+
+    return list(batches.values())
@@ -0,0 +1,131 @@
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+from overpass_json import OverpassElements
+
+# Time in seconds after which cached responses are downloaded again
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+# Metadata files are read and merged by concurrent downloads
+metadata_lock = threading.Lock()
+
+
+def get_cache_key(query, bounding_box):
+    return hashlib.sha1(json.dumps([query, list(bounding_box)]).encode("utf-8")).hexdigest()
+
+
+#
+# Main
+#
+
+class OverpassCache:
+    """
+    Overpass responses stored as gzip-compressed compact JSON in files named by a hash of the query and the bounding
+    box, so that a changed query never reads an outdated response. Each entry has a metadata file that records the
+    names it is known by, the query, the bounding box, the time it was created and its TTL
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+
+    def get_file_path(self, query, bounding_box):
+        return os.path.join(self.cache_path, get_cache_key(query, bounding_box) + ".json.gz")
+
+    def get_metadata_file_path(self, query, bounding_box):
+        return os.path.join(self.cache_path, get_cache_key(query, bounding_box) + ".meta.json")
+
+    def get_metadata(self, query, bounding_box):
+        metadata_file_path = self.get_metadata_file_path(query, bounding_box)
+
+        if not os.path.exists(metadata_file_path) or not os.path.exists(self.get_file_path(query, bounding_box)):
+            return None
+
+        with open(metadata_file_path, "r") as f:
+            return json.load(f)
+
+    def write_metadata(self, names, query, bounding_box, num_elements, ttl=DEFAULT_TTL):
+        """
+        Records a downloaded response, keeping the names of earlier requests for the same query and bounding box
+        :param names: names of the requests, e.g. stations-bus
+        :param query: statement without bounding box
+        :param bounding_box: bounding box
+        :param num_elements: number of elements of the response
+        :param ttl: time in seconds after which the response is downloaded again
+        """
+        metadata_file_path = self.get_metadata_file_path(query, bounding_box)
+
+        with metadata_lock:
+            metadata = self.get_metadata(query, bounding_box)
+            previous_names = metadata["names"] if metadata is not None else []
+
+            metadata = {
+                "key": get_cache_key(query, bounding_box),
+                "names": sorted(set(previous_names) | set(names)),
+                "query": query,
+                "bounding_box": list(bounding_box),
+                "created": time.time(),
+                "ttl": ttl,
+                "num_elements": num_elements
+            }
+
+            temporary_file_path = f"{metadata_file_path}.{threading.get_ident()}.tmp"
+            with open(temporary_file_path, "w") as f:
+                json.dump(metadata, f, indent=4)
+            os.replace(temporary_file_path, metadata_file_path)
+
+    def is_fresh(self, query, bounding_box):
+        metadata = self.get_metadata(query, bounding_box)
+        return metadata is not None and time.time() - metadata["created"] < metadata["ttl"]
+
+    def load(self, query, bounding_box):
+        """
+        Loads a cached response regardless of its age
+        :param query: statement without bounding box
+        :param bounding_box: bounding box
+        :return: elements or None if the response is not cached
+        """
+        if self.get_metadata(query, bounding_box) is None:
+            return None
+
+        return OverpassElements(self.get_file_path(query, bounding_box))
+
+    def get_entry_file_path(self, metadata):
+        return os.path.join(self.cache_path, metadata["key"] + ".json.gz")
+
+    def get_entries(self):
+        entries = []
+
+        for metadata_file_path in sorted(glob.iglob(os.path.join(self.cache_path, "*.meta.json"))):
+            with open(metadata_file_path, "r") as f:
+                metadata = json.load(f)
+
+            if os.path.exists(self.get_entry_file_path(metadata)):
+                entries.append(metadata)
+
+        return entries
+
+    def invalidate(self, pattern="*", expired_only=False):
+        """
+        Removes cached responses
+        :param pattern: shell-style pattern matched against the names of the entries, e.g. routes-*
+        :param expired_only: only remove entries whose TTL has passed
+        :return: number of removed entries
+        """
+        num_removed = 0
+
+        for metadata in self.get_entries():
+            if not any(fnmatch.fnmatch(name, pattern) for name in metadata["names"]):
+                continue
+            if expired_only and time.time() - metadata["created"] < metadata["ttl"]:
+                continue
+
+            os.remove(os.path.join(self.cache_path, metadata["key"] + ".meta.json"))
+            os.remove(self.get_entry_file_path(metadata))
+            num_removed += 1
+
+        return num_removed
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default endpoint, can be overridden by the OVERPASS_ENDPOINT environment variable, e.g. to use a local server
+OVERPASS_ENDPOINT = "https://overpass-api.de/api/interpreter"
+
+# Status codes of responses that are worth retrying
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def get_retry_after(response):
+    """
+    Reads the delay requested by the server
+    :param response: response
+    :return: delay in seconds or None if the server did not request one
+    """
+    retry_after = response.headers.get("Retry-After")
+
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Spaces out requests of all threads so that no more than a given number of requests per second is started
+    """
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            request_time = max(now, self.next_request_time)
+            self.next_request_time = request_time + self.interval
+
+        if request_time > now:
+            time.sleep(request_time - now)
+
+
+# Client shared by all loaders so that they use the same connection pool and rate limit
+overpass_client = None
+overpass_client_lock = threading.Lock()
+
+
+def get_overpass_client():
+    global overpass_client
+
+    with overpass_client_lock:
+        if overpass_client is None:
+            overpass_client = OverpassClient()
+
+        return overpass_client
+
+
+#
+# Main
+#
+
+class OverpassClient:
+    """
+    Sends queries to an Overpass API endpoint through a pooled session, retries failed requests with exponential
+    backoff and limits the rate of requests
+    """
+
+    def __init__(self, endpoint=None, connect_timeout=10, read_timeout=180, max_retries=5, backoff_factor=2.0,
+                 max_backoff=120, requests_per_second=1.0, max_concurrent_requests=2, pool_size=8):
+        self.endpoint = endpoint if endpoint is not None else os.environ.get("OVERPASS_ENDPOINT", OVERPASS_ENDPOINT)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        # The public Overpass API only runs a few queries per client at a time, no matter how many threads send them
+        self.slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_backoff(self, attempt, response=None):
+        # Servers that ask for a specific delay get exactly that
+        retry_after = get_retry_after(response) if response is not None else None
+
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        else:
+            return min(self.backoff_factor * 2 ** attempt, self.max_backoff)
+
+    def get_response(self, data, stream=False):
+        url = f"{self.endpoint}?data={quote(data)}"
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+
+            try:
+                response = self.session.get(url, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+
+                time.sleep(self.get_backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                response.close()
+                time.sleep(self.get_backoff(attempt, response))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def download(self, data, file_path, chunk_size=1024 * 1024):
+        """
+        Runs an Overpass query and streams the response to a file without holding it in memory
+        :param data: query in Overpass QL
+        :param file_path: file path to write the response to
+        :param chunk_size: number of bytes to read at once
+        """
+        with self.slots:
+            with self.get_response(data, stream=True) as response, open(file_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
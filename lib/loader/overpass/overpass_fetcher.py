@@ -0,0 +1,90 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from overpass_batch import fetch_batch, get_batches
+from overpass_cache import OverpassCache
+from overpass_line_loader import get_line_query
+from overpass_route_loader import get_route_query
+from overpass_station_loader import get_station_query
+from tracking_decorator import TrackingDecorator
+
+
+def get_public_transport_requests(results_path, city_id, bounding_box, public_transport_type):
+    """
+    Lists the station, line and route requests of a public transport type, using the same cache as the loaders
+    :return: list of requests with a name, a file name, a cache path, a bounding box and a query
+    """
+    return [
+        {
+            "name": f"{city_id} station {public_transport_type}",
+            "file_name": "stations-" + public_transport_type,
+            "cache_path": results_path,
+            "bounding_box": bounding_box,
+            "query": get_station_query(public_transport_type)
+        },
+        {
+            "name": f"{city_id} line {public_transport_type}",
+            "file_name": "lines-" + public_transport_type,
+            "cache_path": results_path,
+            "bounding_box": bounding_box,
+            "query": get_line_query(public_transport_type)
+        },
+        {
+            "name": f"{city_id} route {public_transport_type}",
+            "file_name": "routes-" + public_transport_type,
+            "cache_path": results_path,
+            "bounding_box": bounding_box,
+            "query": get_route_query(public_transport_type)
+        }
+    ]
+
+
+#
+# Main
+#
+
+class OverpassFetcher:
+
+    @TrackingDecorator.track_time
+    def run(self, logger, requests, max_workers=2, clean=False, quiet=False):
+        """
+        Downloads all requests that are not cached or whose cached responses expired. Requests sharing a bounding box
+        are combined into one union query, and a bounded number of these batches run concurrently, sharing the rate
+        limit of the Overpass client
+        :param logger: logger
+        :param requests: list of requests with a name, a file name, a cache path, a bounding box and a query
+        :param max_workers: number of concurrent requests, the public Overpass API allows two slots per client
+        :param clean: download requests even if their cached responses are still fresh
+        :param quiet: do not log successful requests
+        """
+        pending_requests = [request for request in requests
+                            if clean or not OverpassCache(request["cache_path"]).is_fresh(request["query"],
+                                                                                          request["bounding_box"])]
+
+        batches = get_batches(pending_requests)
+        latencies = []
+        num_failed = 0
+        start_time = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch_batch, batch) for batch in batches]
+
+            for future in as_completed(futures):
+                results, latency = future.result()
+                latencies.append(latency)
+
+                for request, succeeded, error in results:
+                    if succeeded:
+                        if not quiet:
+                            logger.log_line(f"✓ Download {request['name']} in {latency:.2f}s")
+                    else:
+                        num_failed += 1
+                        logger.log_line(f"✗️ Failed to download {request['name']} in {latency:.2f}s: {error}")
+
+        wall_time = time.monotonic() - start_time
+
+        if not quiet and len(latencies) > 0:
+            logger.log_line(f"✓ Fetch {len(pending_requests)} requests in {len(batches)} batches ({num_failed} failed, "
+                            f"{len(requests) - len(pending_requests)} cached) in {wall_time:.1f}s, "
+                            f"latency median {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s")
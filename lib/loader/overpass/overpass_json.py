@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import threading
+
+import ijson
+
+
+def open_file(file_path, mode):
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, mode)
+    else:
+        return open(file_path, mode)
+
+
+def iterate_elements(file_path):
+    """
+    Parses the elements of an Overpass response one by one so that memory does not grow with the size of the file
+    :param file_path: file path of an Overpass response
+    :return: generator of elements
+    """
+    with open_file(file_path, "rb") as f:
+        yield from ijson.items(f, "elements.item", use_float=True)
+
+
+def get_remark(file_path):
+    # Overpass reports errors such as timeouts during a query in a remark next to the elements it managed to collect
+    with open_file(file_path, "rb") as f:
+        return next(ijson.items(f, "remark"), None)
+
+
+def get_temporary_file_path(file_path):
+    # Include the thread so that concurrent downloads of the same file do not share a temporary file
+    return f"{file_path}.{threading.get_ident()}.tmp"
+
+
+class OverpassElements:
+    """
+    Elements of an Overpass response on disk, parsed incrementally each time they are iterated
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def __iter__(self):
+        return iterate_elements(self.file_path)
+
+
+class OverpassElementsWriter:
+    """
+    Writes elements to an Overpass response file one by one as compact JSON, compressed if the file name ends with
+    .gz, replacing the file only once it is complete
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.temporary_file_path = get_temporary_file_path(file_path)
+        self.file = None
+        self.num_elements = 0
+
+    def __enter__(self):
+        if self.file_path.endswith(".gz"):
+            self.file = gzip.open(self.temporary_file_path, "wt", encoding="utf-8")
+        else:
+            self.file = open(self.temporary_file_path, "w", encoding="utf-8")
+
+        self.file.write("{\"elements\": [")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.file.write("\n]}\n")
+        finally:
+            self.file.close()
+
+        # Responses without elements are kept so that they are cached like any other response
+        if exc_type is None:
+            os.replace(self.temporary_file_path, self.file_path)
+        else:
+            os.remove(self.temporary_file_path)
+
+    def write_element(self, element):
+        if self.num_elements > 0:
+            self.file.write(",")
+
+        self.file.write("\n" + json.dumps(element, ensure_ascii=False, separators=(",", ":")))
+        self.num_elements += 1
@@ -1,75 +1,28 @@
-import json
 import os
-from urllib.parse import quote
 
-import requests
+from overpass_cache import OverpassCache
+from overpass_loader import download_json
 from tracking_decorator import TrackingDecorator
 
 
-def download_line_json(logger, file_path, bounding_box, public_transport_type):
-    bbox = f"({bounding_box[1]}, {bounding_box[0]}, {bounding_box[3]}, {bounding_box[2]})"
-
-    try:
-        if public_transport_type == "bus":
-            data = f"""
-[out:json][timeout:25];
-(
-  way["highway"~"secondary|tertiary|residential|bus_stop"]{bbox};  
-);
-out geom;
-                """
-        elif public_transport_type == "light_rail":
-            data = f"""
-[out:json][timeout:25];
-(
-  way["railway"~"light_rail"]{bbox};  
-);
-out geom;
-                """
-        elif public_transport_type == "subway":
-            data = f"""
-[out:json][timeout:25];
-(
-  way["railway"~"subway"]{bbox};  
-);
-out geom;
-                """
-        elif public_transport_type == "tram":
-            data = f"""
-[out:json][timeout:25];
-(
-  way["railway"~"tram"]{bbox};  
-);
-out geom;
-                """
-        else:
-            raise Exception
-
-        formatted_data = quote(data.lstrip("\n"))
-
-        url = f"https://overpass-api.de/api/interpreter?data={formatted_data}"
-        response = requests.get(url)
-        text = response.text.replace("'", "")
-        json_content = json.loads(text)
-
-        if len(json_content["elements"]) > 0:
-            with open(file_path, "w") as f:
-                json.dump(json_content, f, ensure_ascii=False, indent=4)
-
-            return json_content
-        else:
-            return None
-
-    except Exception as e:
-        logger.log_line(f"✗️ Exception: {str(e)}")
-        return None
+def get_line_query(public_transport_type):
+    if public_transport_type == "bus":
+        data = 'way["highway"~"secondary|tertiary|residential|bus_stop"]'
+    elif public_transport_type == "light_rail":
+        data = 'way["railway"~"light_rail"]'
+    elif public_transport_type == "subway":
+        data = 'way["railway"~"subway"]'
+    elif public_transport_type == "tram":
+        data = 'way["railway"~"tram"]'
+    else:
+        raise Exception
 
+    return data
 
-def load_json(file_path):
-    with open(file_path, "r") as f:
-        text = f.read()
 
-    return json.loads(text.replace("'", ""))
+def download_line_json(logger, cache_path, bounding_box, public_transport_type):
+    return download_json(logger, cache_path, "lines-" + public_transport_type, bounding_box,
+                         get_line_query(public_transport_type))
 
 
 #
@@ -83,16 +36,17 @@ class OverpassLineLoader:
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
-        # Define file path
-        file_path = os.path.join(results_path, "lines-" + public_transport_type + ".json")
+        # Define cache
+        query = get_line_query(public_transport_type)
+        cache = OverpassCache(results_path)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not cache.is_fresh(query, bounding_box):
 
             # Download json
             json_content = download_line_json(
                 logger=logger,
-                file_path=file_path,
+                cache_path=results_path,
                 bounding_box=bounding_box,
                 public_transport_type=public_transport_type
             )
@@ -106,10 +60,11 @@ class OverpassLineLoader:
                 if not quiet:
                     logger.log_line(f"✗️ Failed to download {city_id} line {public_transport_type}")
 
-                return None
+                # Fall back to an outdated response if there is one
+                return cache.load(query, bounding_box)
         else:
-            # Load graph
-            json_content = load_json(file_path=file_path)
+            # Load json
+            json_content = cache.load(query, bounding_box)
 
             if not quiet:
                 logger.log_line(f"✓ Load {city_id} line {public_transport_type}")
@@ -1,51 +1,28 @@
-import json
 import os
-from urllib.parse import quote
 
-import requests
+from overpass_batch import fetch_batch
+from overpass_cache import OverpassCache
 from tracking_decorator import TrackingDecorator
 
 
-def download_json(logger, file_path, bounding_box, query):
-    bbox = f"({bounding_box[1]}, {bounding_box[0]}, {bounding_box[3]}, {bounding_box[2]})"
+def download_json(logger, cache_path, file_name, bounding_box, query):
+    results, _ = fetch_batch([{
+        "name": file_name,
+        "file_name": file_name,
+        "cache_path": cache_path,
+        "bounding_box": bounding_box,
+        "query": query
+    }])
+    _, succeeded, error = results[0]
 
-    try:
-        data = f"""
-[out:json][timeout:25];
-(
-  {query}{bbox};  
-);
-out geom;
-                """
-
-        formatted_data = quote(data.lstrip("\n"))
-
-        url = f"https://overpass-api.de/api/interpreter?data={formatted_data}"
-        response = requests.get(url)
-        text = response.text.replace("'", "")
-        json_content = json.loads(text)
-
-        if len(json_content["elements"]) > 0:
-            with open(file_path, "w") as f:
-                json.dump(json_content, f, ensure_ascii=False, indent=4)
-
-            return json_content
-        else:
-            return None
-
-    except Exception as e:
+    if succeeded:
+        return OverpassCache(cache_path).load(query, bounding_box)
+    else:
         if logger is not None:
-            logger.log_line(f"✗️ Exception: {str(e)}")
+            logger.log_line(f"✗️ Exception: {error}")
         return None
 
 
-def load_json(file_path):
-    with open(file_path, "r") as f:
-        text = f.read()
-
-    return json.loads(text.replace("'", ""))
-
-
 #
 # Main
 #
@@ -65,20 +42,22 @@ class OverpassLoader:
         # Make results path
         os.makedirs(os.path.join(self.results_path), exist_ok=True)
 
-        # Define file path
-        file_path = os.path.join(self.results_path, result_file_name)
+        # Define cache
+        file_name = os.path.splitext(result_file_name)[0]
+        cache = OverpassCache(self.results_path)
 
-        # Check if result needs to be generated
-        if self.clean or clean or not os.path.exists(file_path):
+        # Override bounding box if necessary
+        if bounding_box is None:
+            bounding_box = self.bounding_box
 
-            # Override bounding box if necessary
-            if bounding_box is None:
-                bounding_box = self.bounding_box
+        # Check if result needs to be generated
+        if self.clean or clean or not cache.is_fresh(query, bounding_box):
 
             # Download json
             json_content = download_json(
                 logger=self.logger,
-                file_path=file_path,
+                cache_path=self.results_path,
+                file_name=file_name,
                 bounding_box=bounding_box,
                 query=query
             )
@@ -92,10 +71,11 @@ class OverpassLoader:
                 if not self.quiet:
                     self.logger.log_line(f"✗️ Failed to download {self.city_id} {result_file_name}")
 
-                return None
+                # Fall back to an outdated response if there is one
+                return cache.load(query, bounding_box)
         else:
-            # Load graph
-            json_content = load_json(file_path=file_path)
+            # Load json
+            json_content = cache.load(query, bounding_box)
 
             if not self.quiet:
                 self.logger.log_line(f"✓ Load {self.city_id} {result_file_name}")
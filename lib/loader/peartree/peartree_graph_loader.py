@@ -1,13 +1,13 @@
 import os
 
-import osmnx as ox
 import peartree as pt
+from graph_store import GRAPH_FILE_EXTENSION, graph_exists, load_graph, save_graph
 from tracking_decorator import TrackingDecorator
 
 
 def download_transport_graph(logger, data_path, results_path, transport_association, start_time, end_time,
-                             existing_graph):
-    file_path = os.path.join(results_path, f"transport-{start_time}-{end_time}-osmnx.graphml")
+                             existing_graph, export_graphml=False):
+    file_path = os.path.join(results_path, f"transport-{start_time}-{end_time}-osmnx" + GRAPH_FILE_EXTENSION)
 
     try:
         gtfs_path = os.path.join(data_path, "transport-associations", transport_association, "GTFS.zip")
@@ -15,7 +15,7 @@ def download_transport_graph(logger, data_path, results_path, transport_associat
         graph_transport = pt.load_feed_as_graph(feed, start_time, end_time, existing_graph, use_multiprocessing=True)
 
         # Save graph
-        ox.save_graphml(graph_transport, file_path)
+        save_graph(graph_transport, file_path, export_graphml=export_graphml)
         # nx.write_graphml(graph_transport, os.path.join(results_path, f"transport-{start_time}-{end_time}-nx.graphml"))
         # nx.write_gpickle(graph_transport, os.path.join(results_path, f"transport-{start_time}-{end_time}-nx.gpickle"))
         # nx.write_gml(graph_transport, os.path.join(results_path, f"transport-{start_time}-{end_time}-nx.gml"))
@@ -30,7 +30,7 @@ def download_transport_graph(logger, data_path, results_path, transport_associat
 
 
 def load_transport_graph(file_path):
-    return ox.load_graphml(file_path)
+    return load_graph(file_path)
 
 
 #
@@ -40,16 +40,16 @@ def load_transport_graph(file_path):
 class PeartreeGraphLoader:
 
     @TrackingDecorator.track_time
-    def run(self, logger, data_path, results_path, transport_association, start_time, end_time, existing_graph=None, clean=False,
-            quiet=False):
+    def run(self, logger, data_path, results_path, transport_association, start_time, end_time, existing_graph=None,
+            export_graphml=False, clean=False, quiet=False):
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
         # Define file path
-        file_path = os.path.join(results_path, f"transport-{start_time}-{end_time}-osmnx.graphml")
+        file_path = os.path.join(results_path, f"transport-{start_time}-{end_time}-osmnx" + GRAPH_FILE_EXTENSION)
 
         # Check if result needs to be generated
-        if clean or not os.path.exists(file_path):
+        if clean or not graph_exists(file_path):
 
             # Download graph
             graph = download_transport_graph(
@@ -59,7 +59,8 @@ class PeartreeGraphLoader:
                 transport_association=transport_association,
                 start_time=start_time,
                 end_time=end_time,
-                existing_graph=existing_graph
+                existing_graph=existing_graph,
+                export_graphml=export_graphml
             )
 
             if not quiet:
@@ -50,8 +50,7 @@ def get_station_information(logger, results_path, city_id, area, inhabitants, bo
 
 def get_station_ids(stations):
     nodes = []
-    elements = stations["elements"]
-    for element in elements:
+    for element in stations:
         id = element["id"]
         nodes.append(id)
 
@@ -96,8 +95,7 @@ def get_line_information(logger, results_path, city_id, area, inhabitants, bound
 
 def get_line_ids(lines):
     ways = []
-    elements = lines["elements"]
-    for element in elements:
+    for element in lines:
         id = element["id"]
         ways.append(id)
 
@@ -106,9 +104,7 @@ def get_line_ids(lines):
 
 def load_json(file_path):
     with open(file_path, "r") as f:
-        text = f.read()
-
-    return json.loads(text.replace("'", ""))
+        return json.load(f)
 
 
 class CityMetricsBuilder:
@@ -1,23 +1,73 @@
-import math
 import os
 
 from bike_information import BikeInformation
 from cities import Cities
 from line_information import LineInformation
+from node_index import EARTH_RADIUS
+from overpass_batch import fetch_batch, get_batches
+from overpass_cache import OverpassCache
 from overpass_loader import OverpassLoader
 from place_metrics import PlaceMetrics
+from place_metrics_index import PlaceMetricsIndex, place_metrics_index_cache
 from ranked_value import RankedValue
 from station_information import StationInformation
 
-
-def get_station_information(results_path, city_name, bounding_box, public_transport_type, lat, lon):
-    walking_time_min = 15
-    walking_speed_kph = 4.5
-    radius_km = walking_time_min / 60 * walking_speed_kph
-
-    # List of IDs of what we consider a station (may be a stop area containing multiple stations)
-    station_ids = []
-
+# Files and queries of the OSM elements place metrics are computed from, per public transport type
+PLACE_METRICS_QUERIES = {
+    "bus": {
+        "nodes_bus_stop.json": 'node["highway"="bus_stop"]',
+        "ways_bus_platform.json": 'way["public_transport"="platform"]["bus"="yes"]',
+        "relations_bus_stop_area.json": 'relation["type"="public_transport"]["public_transport"="stop_area"]'
+    },
+    "light_rail": {
+        "nodes_light_rail_station.json": 'node["railway"~"station|halt"]["public_transport"="station"]["light_rail"="yes"]',
+        "relations_light_rail_stop_area.json": 'relation["type"="public_transport"]["public_transport"="stop_area"]',
+        "relations_light_rail_stop_area_group.json": 'relation["type"="public_transport"]["public_transport"="stop_area_group"]',
+        "ways_light_rail_platform.json": 'way["railway"="platform"]["public_transport"="platform"]["light_rail"="yes"]',
+        "relations_light_rail_route.json": 'relation["line"="light_rail"]["route"="train"]'
+    },
+    "tram": {
+        "nodes_tram_stop.json": 'node["railway"="tram_stop"]["public_transport"="stop_position"]["tram"="yes"]',
+        "relations_tram_stop.json": 'relation["type"="public_transport"]["public_transport"="stop_area"]',
+        "relations_tram_stop_area_group.json": 'relation["type"="public_transport"]["public_transport"="stop_area_group"]',
+        "relations_tram_route.json": 'relation["route"="tram"]'
+    },
+    "subway": {
+        "nodes_subway_station.json": 'node["railway"~"station|halt"]["public_transport"="station"]["subway"="yes"]',
+        "relations_subway_stop_area.json": 'relation["type"="public_transport"]["public_transport"="stop_area"]',
+        "relations_subway_stop_area_group.json": 'relation["type"="public_transport"]["public_transport"="stop_area_group"]',
+        "ways_subway_platform.json": 'way["railway"="platform"]["public_transport"="platform"]["subway"="yes"]',
+        "relations_subway_route.json": 'relation["route"="subway"]'
+    }
+}
+
+
+def get_place_metrics_requests(results_path, city_name, bounding_box, public_transport_types):
+    return [
+        {
+            "name": f"{city_name} {result_file_name}",
+            "file_name": os.path.splitext(result_file_name)[0],
+            "cache_path": os.path.join(results_path, "osm"),
+            "bounding_box": bounding_box,
+            "query": query
+        }
+        for public_transport_type in public_transport_types
+        for result_file_name, query in PLACE_METRICS_QUERIES[public_transport_type].items()
+    ]
+
+
+def get_place_metrics_signature(results_path, bounding_box, public_transport_types):
+    # Metadata files are rewritten whenever a response is downloaded again
+    cache = OverpassCache(os.path.join(results_path, "osm"))
+    metadata_file_paths = [cache.get_metadata_file_path(query, bounding_box)
+                           for public_transport_type in public_transport_types
+                           for query in PLACE_METRICS_QUERIES[public_transport_type].values()]
+
+    return tuple(os.path.getmtime(file_path) if os.path.exists(file_path) else None
+                 for file_path in metadata_file_paths)
+
+
+def load_place_metrics_index(results_path, city_name, bounding_box, public_transport_types):
     overpass_loader = OverpassLoader(
         logger=None,
         results_path=os.path.join(results_path, "osm"),
@@ -27,70 +77,59 @@ def get_station_information(results_path, city_name, bounding_box, public_transp
         quiet=True
     )
 
+    elements_by_query = {}
+    elements_by_file_name = {}
+
+    for public_transport_type in public_transport_types:
+        for result_file_name, query in PLACE_METRICS_QUERIES[public_transport_type].items():
+            # Files with identical queries share their elements
+            if query not in elements_by_query:
+                elements_by_query[query] = overpass_loader.run(result_file_name=result_file_name, query=query)
+
+            elements_by_file_name[result_file_name] = elements_by_query[query]
+
+    return PlaceMetricsIndex(elements_by_file_name)
+
+
+def get_station_information(index, public_transport_type, lat, lon):
+    walking_time_min = 15
+    walking_speed_kph = 4.5
+    radius_km = walking_time_min / 60 * walking_speed_kph
+
+    # List of IDs of what we consider a station (may be a stop area containing multiple stations)
+    station_ids = []
+
     if public_transport_type == "bus":
-        bus_stops = overpass_loader.run(result_file_name="nodes_bus_stop.json", query='node["highway"="bus_stop"]')
-        bus_platforms = overpass_loader.run(
-            result_file_name="ways_bus_platform.json",
-            query='way["public_transport"="platform"]["bus"="yes"]'
-        )
-        bus_stop_areas = overpass_loader.run(
-            result_file_name="relations_bus_stop_area.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
+        bus_stops = index.get_node_index("nodes_bus_stop.json")
+        bus_platforms = index.get_member_index("ways_bus_platform.json")
+        bus_stop_areas = index.get_member_index("relations_bus_stop_area.json")
 
         bus_stop_ids = get_nodes_in_radius(lat, lon, radius_km, bus_stops)
         bus_platform_ids = get_way_ids_by_node_ids(bus_platforms, bus_stop_ids)
         bus_stop_area_ids = get_relation_ids_by_way_ids(bus_stop_areas, bus_platform_ids)
         station_ids = bus_stop_area_ids
     elif public_transport_type == "light_rail":
-        light_rail_stations = overpass_loader.run(
-            result_file_name="nodes_light_rail_station.json",
-            query='node["railway"~"station|halt"]["public_transport"="station"]["light_rail"="yes"]'
-        )
-        light_rail_stop_areas = overpass_loader.run(
-            result_file_name="relations_light_rail_stop_area.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
-        light_rail_stop_area_groups = overpass_loader.run(
-            result_file_name="relations_light_rail_stop_area_group.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area_group"]'
-        )
+        light_rail_stations = index.get_node_index("nodes_light_rail_station.json")
+        light_rail_stop_areas = index.get_member_index("relations_light_rail_stop_area.json")
+        light_rail_stop_area_groups = index.get_member_index("relations_light_rail_stop_area_group.json")
 
         light_rail_station_ids = get_nodes_in_radius(lat, lon, radius_km, light_rail_stations)
         light_rail_stop_area_ids = get_relation_ids_by_node_ids(light_rail_stop_areas, light_rail_station_ids)
         light_rail_stop_area_group_ids = get_relation_ids_by_relation_ids(light_rail_stop_area_groups, light_rail_stop_area_ids)
         station_ids = light_rail_stop_area_group_ids
     elif public_transport_type == "tram":
-        tram_stops = overpass_loader.run(
-            result_file_name="nodes_tram_stop.json",
-            query='node["railway"="tram_stop"]["public_transport"="stop_position"]["tram"="yes"]'
-        )
-        tram_stop_areas = overpass_loader.run(
-            result_file_name="relations_tram_stop.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
-        tram_stop_area_groups = overpass_loader.run(
-            result_file_name="relations_tram_stop_area_group.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area_group"]'
-        )
+        tram_stops = index.get_node_index("nodes_tram_stop.json")
+        tram_stop_areas = index.get_member_index("relations_tram_stop.json")
+        tram_stop_area_groups = index.get_member_index("relations_tram_stop_area_group.json")
 
         tram_stop_ids = get_nodes_in_radius(lat, lon, radius_km, tram_stops)
         tram_stop_area_ids = get_relation_ids_by_node_ids(tram_stop_areas, tram_stop_ids)
         tram_stop_area_group_ids = get_relation_ids_by_relation_ids(tram_stop_area_groups, tram_stop_area_ids)
         station_ids = tram_stop_area_group_ids
     elif public_transport_type == "subway":
-        subway_stations = overpass_loader.run(
-            result_file_name="nodes_subway_station.json",
-            query='node["railway"~"station|halt"]["public_transport"="station"]["subway"="yes"]'
-        )
-        subway_stop_areas = overpass_loader.run(
-            result_file_name="relations_subway_stop_area.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
-        subway_stop_area_groups = overpass_loader.run(
-            result_file_name="relations_subway_stop_area_group.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area_group"]'
-        )
+        subway_stations = index.get_node_index("nodes_subway_station.json")
+        subway_stop_areas = index.get_member_index("relations_subway_stop_area.json")
+        subway_stop_area_groups = index.get_member_index("relations_subway_stop_area_group.json")
     
         subway_station_ids = get_nodes_in_radius(lat, lon, radius_km, subway_stations)
         subway_stop_area_ids = get_relation_ids_by_node_ids(subway_stop_areas, subway_station_ids)
@@ -107,7 +146,7 @@ def get_station_information(results_path, city_name, bounding_box, public_transp
     return station_information
 
 
-def get_line_information(results_path, city_name, bounding_box, public_transport_type, lat, lon):
+def get_line_information(index, public_transport_type, lat, lon):
     walking_time_min = 15
     walking_speed_kph = 4.5
     radius_km = walking_time_min / 60 * walking_speed_kph
@@ -115,15 +154,6 @@ def get_line_information(results_path, city_name, bounding_box, public_transport
     # List of IDs of what we consider a line
     line_ids = []
 
-    overpass_loader = OverpassLoader(
-        logger=None,
-        results_path=os.path.join(results_path, "osm"),
-        city_id=city_name,
-        bounding_box=bounding_box,
-        clean=False,
-        quiet=True
-    )
-
     if public_transport_type == "bus":
         # FIXME
         #
@@ -144,22 +174,10 @@ def get_line_information(results_path, city_name, bounding_box, public_transport
         # line_ids = bus_route_ids
         line_ids = []
     elif public_transport_type == "light_rail":
-        light_rail_stations = overpass_loader.run(
-            result_file_name="nodes_light_rail_station.json",
-            query='node["railway"~"station|halt"]["public_transport"="station"]["light_rail"="yes"]'
-        )
-        light_rail_stop_areas = overpass_loader.run(
-            result_file_name="relations_light_rail_stop_area.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
-        light_rail_platforms = overpass_loader.run(
-            result_file_name="ways_light_rail_platform.json",
-            query='way["railway"="platform"]["public_transport"="platform"]["light_rail"="yes"]'
-        )
-        light_rail_routes = overpass_loader.run(
-            result_file_name="relations_light_rail_route.json",
-            query='relation["line"="light_rail"]["route"="train"]'
-        )
+        light_rail_stations = index.get_node_index("nodes_light_rail_station.json")
+        light_rail_stop_areas = index.get_member_index("relations_light_rail_stop_area.json")
+        light_rail_platforms = index.get_member_index("ways_light_rail_platform.json")
+        light_rail_routes = index.get_member_index("relations_light_rail_route.json")
 
         light_rail_station_ids = get_nodes_in_radius(lat, lon, radius_km, light_rail_stations)
         light_rail_stop_area_ids = get_relation_ids_by_node_ids(light_rail_stop_areas, light_rail_station_ids)
@@ -167,34 +185,17 @@ def get_line_information(results_path, city_name, bounding_box, public_transport
         light_rail_route_refs = get_relation_refs_by_relation_ids(light_rail_routes, light_rail_platform_ids)
         line_ids = light_rail_route_refs
     elif public_transport_type == "tram":
-        tram_stops = overpass_loader.run(
-            result_file_name="nodes_tram_stop.json",
-            query='node["railway"="tram_stop"]["public_transport"="stop_position"]["tram"="yes"]'
-        )
-        tram_routes = overpass_loader.run(
-            result_file_name="relations_tram_route.json", query='relation["route"="tram"]'
-        )
+        tram_stops = index.get_node_index("nodes_tram_stop.json")
+        tram_routes = index.get_member_index("relations_tram_route.json")
 
         tram_stop_ids = get_nodes_in_radius(lat, lon, radius_km, tram_stops)
         tram_route_ids = get_relation_refs_by_node_ids(tram_routes, tram_stop_ids)
         line_ids = tram_route_ids
     elif public_transport_type == "subway":
-        subway_stations = overpass_loader.run(
-            result_file_name="nodes_subway_station.json",
-            query='node["railway"~"station|halt"]["public_transport"="station"]["subway"="yes"]'
-        )
-        subway_stop_areas = overpass_loader.run(
-            result_file_name="relations_subway_stop_area.json",
-            query='relation["type"="public_transport"]["public_transport"="stop_area"]'
-        )
-        subway_platforms = overpass_loader.run(
-            result_file_name="ways_subway_platform.json",
-            query='way["railway"="platform"]["public_transport"="platform"]["subway"="yes"]'
-        )
-        subway_routes = overpass_loader.run(
-            result_file_name="relations_subway_route.json",
-            query='relation["route"="subway"]'
-        )
+        subway_stations = index.get_node_index("nodes_subway_station.json")
+        subway_stop_areas = index.get_member_index("relations_subway_stop_area.json")
+        subway_platforms = index.get_member_index("ways_subway_platform.json")
+        subway_routes = index.get_member_index("relations_subway_route.json")
 
         subway_station_ids = get_nodes_in_radius(lat, lon, radius_km, subway_stations)
         subway_stop_area_ids = get_relation_ids_by_node_ids(subway_stop_areas, subway_station_ids)
@@ -211,197 +212,48 @@ def get_line_information(results_path, city_name, bounding_box, public_transport
     return line_information
 
 
-# See https://en.wikipedia.org/wiki/Haversine_formula
-def get_distance(point_a, point_b):
-    earth_radius = 6373.0
-
-    lat_a = math.radians(float(point_a[0]))
-    lon_a = math.radians(float(point_a[1]))
-    lat_b = math.radians(float(point_b[0]))
-    lon_b = math.radians(float(point_b[1]))
-
-    distance_lon = lon_b - lon_a
-    distance_lat = lat_b - lat_a
+def get_nodes_in_radius(lat, lon, radius, node_index):
+    if node_index is None:
+        return []
 
-    # Apply Haversine formula
-    a = math.sin(distance_lat / 2) ** 2 + math.cos(lat_a) * math.cos(lat_b) * math.sin(distance_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    return earth_radius * c
-
-
-def get_nodes_in_radius(lat, lon, radius, stations):
-    nodes = []
-    elements = stations["elements"]
-    for element in elements:
-        element_id = element["id"]
-        station_lat = element["lat"]
-        station_lon = element["lon"]
-
-        start_point = (lat, lon)
-        station_point = (station_lat, station_lon)
-        distance = get_distance(start_point, station_point)
-
-        if distance < radius:
-            nodes.append(element_id)
-
-    return nodes
+    # Radius in kilometers on a sphere with a radius of 6373 kilometers, scaled to meters on the sphere of the index
+    return node_index.get_nodes_in_radius([float(lon)], [float(lat)], radius / 6373.0 * EARTH_RADIUS)[0].tolist()
 
 
 def get_way_ids_by_node_ids(ways, node_ids):
-    results = []
-
-    if ways is not None:
-        elements = ways["elements"]
-        for element in elements:
-            element_id = element["id"]
-            members = element["nodes"]
-
-            for member in members:
-                if member in node_ids and element_id not in results:
-                    results.append(element_id)
-
-    return results
-
+    return ways.get_parent_ids("node", node_ids) if ways is not None else set()
 
-def get_relation_ids_by_relation_ids(relations, relation_ids, element_name="id"):
-    results = []
 
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_id = element[element_name]
-            members = element["members"]
+def get_relation_ids_by_relation_ids(relations, relation_ids):
+    return relations.get_parent_ids("relation", relation_ids) if relations is not None else set()
 
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "relation" and ref in relation_ids and element_id not in results:
-                    results.append(element_id)
 
-    return results
+def get_platform_ids_by_relation_ids(relations, relation_ids):
+    return relations.get_member_refs(relation_ids, "platform") if relations is not None else set()
 
-def get_platform_ids_by_relation_ids(relations, relation_ids, element_name="id"):
-    results = []
 
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_id = element[element_name]
-            members = element["members"]
+def get_relation_ids_by_way_ids(relations, way_ids):
+    return relations.get_parent_ids("way", way_ids) if relations is not None else set()
 
-            if element_id in relation_ids:
-                for member in members:
-                    ref = member["ref"]
-                    member_role = member["role"]
-                    if member_role == "platform" and ref not in results:
-                        results.append(ref)
 
-    return results
-
-def get_relation_ids_by_way_ids(relations, way_ids, element_name="id"):
-    results = []
-
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_id = element[element_name]
-            members = element["members"]
-
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "way" and ref in way_ids and element_id not in results:
-                    results.append(element_id)
-
-    return results
-
-def get_relation_ids_by_node_ids(relations, node_ids, element_name="id"):
-    results = []
-
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_id = element[element_name]
-            members = element["members"]
-
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "node" and ref in node_ids and element_id not in results:
-                    results.append(element_id)
-
-    return results
+def get_relation_ids_by_node_ids(relations, node_ids):
+    return relations.get_parent_ids("node", node_ids) if relations is not None else set()
 
 
 def get_relation_refs_by_node_ids(relations, node_ids):
-    results = []
-
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_ref = element["tags"]["ref"]
-            members = element["members"]
-
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "node" and ref in node_ids and element_ref not in results:
-                    results.append(element_ref)
+    return relations.get_parent_refs("node", node_ids) if relations is not None else set()
 
-    return results
 
 def get_relation_refs_by_relation_ids(relations, relation_ids):
-    results = []
+    return relations.get_parent_refs("relation", relation_ids) if relations is not None else set()
 
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_ref = element["tags"]["ref"]
-            members = element["members"]
-
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "relation" and ref in relation_ids and element_ref not in results:
-                    results.append(element_ref)
-
-    return results
 
 def get_relation_refs_by_way_ids(relations, way_ids):
-    results = []
-
-    if relations is not None:
-        elements = relations["elements"]
-        for element in elements:
-            element_ref = element["tags"]["ref"]
-            members = element["members"]
-
-            for member in members:
-                member_type = member["type"]
-                ref = member["ref"]
-                if member_type == "way" and ref in way_ids and element_ref not in results:
-                    results.append(element_ref)
-
-    return results
+    return relations.get_parent_refs("way", way_ids) if relations is not None else set()
 
 
 def get_lines_by_stations(routes, station_ids):
-    lines = []
-
-    if routes is not None:
-        elements = routes["elements"]
-        for element in elements:
-            element_id = element["id"]
-            members = element["members"]
-
-            for member in members:
-                role = member["role"]
-                ref = member["ref"]
-                if role == "stop" and ref in station_ids and element_id not in lines:
-                    lines.append(element_id)
-
-    return lines
+    return routes.get_parent_ids_by_role("stop", station_ids) if routes is not None else set()
 
 
 class PlaceMetricsBuilder:
@@ -416,17 +268,32 @@ class PlaceMetricsBuilder:
         bounding_box = city["bounding_box"]
         public_transport_types = city["public_transport_types"]
 
+        # Download the elements of all public transport types that are not cached or expired with one union query
+        cache = OverpassCache(os.path.join(self.results_path, "osm"))
+        pending_requests = [request for request in get_place_metrics_requests(self.results_path, city_name,
+                                                                               bounding_box, public_transport_types)
+                            if not cache.is_fresh(request["query"], request["bounding_box"])]
+
+        for batch in get_batches(pending_requests):
+            fetch_batch(batch)
+
+        # Parse the elements of the city only once and keep them in memory for subsequent requests
+        index = place_metrics_index_cache.get_index(
+            key=self.results_path,
+            signature=get_place_metrics_signature(self.results_path, bounding_box, public_transport_types),
+            build_index=lambda: load_place_metrics_index(self.results_path, city_name, bounding_box,
+                                                         public_transport_types)
+        )
+
         station_information = []
         line_information = []
 
         for public_transport_type in public_transport_types:
             transport_station_information = get_station_information(
-                self.results_path, city_name, bounding_box, public_transport_type=public_transport_type, lat=lat,
-                lon=lon
+                index, public_transport_type=public_transport_type, lat=lat, lon=lon
             )
             transport_line_information = get_line_information(
-                self.results_path, city_name, bounding_box, public_transport_type=public_transport_type, lat=lat,
-                lon=lon
+                index, public_transport_type=public_transport_type, lat=lat, lon=lon
             )
 
             if transport_station_information is not None:
@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from node_index import NodeIndex
+
+
+def get_node_index(nodes):
+    return NodeIndex(
+        node_ids=np.array([node["id"] for node in nodes], dtype=np.int64),
+        longitudes=np.array([node["lon"] for node in nodes], dtype=np.float64),
+        latitudes=np.array([node["lat"] for node in nodes], dtype=np.float64)
+    )
+
+
+def get_members(element):
+    if element["type"] == "way":
+        return [("node", ref, "") for ref in element.get("nodes", [])]
+    elif element["type"] == "relation":
+        return [(member["type"], member["ref"], member["role"]) for member in element.get("members", [])]
+    else:
+        return []
+
+
+class MemberIndex:
+    """
+    Inverted index from the members of ways and relations to their parents, so that walking from members to parents
+    takes one dictionary lookup per member instead of a scan over all parents
+    """
+
+    def __init__(self, elements):
+        """
+        :param elements: iterable of ways and relations
+        """
+        self.parent_ids = {}
+        self.parent_refs = {}
+        self.parent_ids_by_role = {}
+        self.member_refs_by_role = {}
+
+        for element in elements:
+            element_id = element["id"]
+            element_ref = element.get("tags", {}).get("ref")
+
+            for member_type, ref, role in get_members(element):
+                self.parent_ids.setdefault((member_type, ref), set()).add(element_id)
+                self.parent_ids_by_role.setdefault((role, ref), set()).add(element_id)
+                self.member_refs_by_role.setdefault((element_id, role), set()).add(ref)
+
+                if element_ref is not None:
+                    self.parent_refs.setdefault((member_type, ref), set()).add(element_ref)
+
+    def get_parent_ids(self, member_type, refs):
+        """
+        :param member_type: type of the members, i.e. node, way or relation
+        :param refs: ids of the members
+        :return: set of ids of the ways or relations containing any of the members
+        """
+        return set().union(*[self.parent_ids.get((member_type, ref), ()) for ref in refs])
+
+    def get_parent_refs(self, member_type, refs):
+        """
+        :param member_type: type of the members, i.e. node, way or relation
+        :param refs: ids of the members
+        :return: set of ref tags of the ways or relations containing any of the members
+        """
+        return set().union(*[self.parent_refs.get((member_type, ref), ()) for ref in refs])
+
+    def get_parent_ids_by_role(self, role, refs):
+        """
+        :param role: role of the members, e.g. stop
+        :param refs: ids of the members of any type
+        :return: set of ids of the relations containing any of the members in this role
+        """
+        return set().union(*[self.parent_ids_by_role.get((role, ref), ()) for ref in refs])
+
+    def get_member_refs(self, parent_ids, role):
+        """
+        :param parent_ids: ids of the ways or relations
+        :param role: role of the members, e.g. platform
+        :return: set of ids of the members of any type having this role in any of the ways or relations
+        """
+        return set().union(*[self.member_refs_by_role.get((parent_id, role), ()) for parent_id in parent_ids])
+
+
+class PlaceMetricsIndex:
+    """
+    Elements place metrics are computed from, parsed once per city and kept in memory. Nodes are held in a KD-tree for
+    radius queries, ways and relations in an inverted index from their members
+    """
+
+    def __init__(self, elements_by_file_name):
+        """
+        :param elements_by_file_name: dictionary of file name to iterable of elements or None if not available
+        """
+        self.node_indices = {}
+        self.member_indices = {}
+
+        # Files sharing the same elements also share their indices
+        indices = {}
+
+        for file_name, elements in elements_by_file_name.items():
+            if elements is None:
+                continue
+
+            if id(elements) not in indices:
+                nodes = []
+                parents = []
+
+                for element in elements:
+                    if element["type"] == "node":
+                        nodes.append(element)
+                    else:
+                        parents.append(element)
+
+                indices[id(elements)] = (get_node_index(nodes), MemberIndex(parents))
+
+            self.node_indices[file_name], self.member_indices[file_name] = indices[id(elements)]
+
+    def get_node_index(self, file_name):
+        return self.node_indices.get(file_name)
+
+    def get_member_index(self, file_name):
+        return self.member_indices.get(file_name)
+
+
+class PlaceMetricsIndexCache:
+    """
+    Least recently used cache of place metrics indices by city, rebuilt when the underlying responses change
+    """
+
+    def __init__(self, max_size=4):
+        self.max_size = max_size
+        self.indices = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_index(self, key, signature, build_index):
+        """
+        Returns the index of a city, building it if it is not cached or outdated
+        :param key: key of the city
+        :param signature: value that changes whenever the responses of the city change
+        :param build_index: function building the index
+        :return: index
+        """
+        with self.lock:
+            if key in self.indices and self.indices[key][0] == signature:
+                self.indices.move_to_end(key)
+                return self.indices[key][1]
+
+        # Build outside of the lock so that requests for other cities are not blocked
+        index = build_index()
+
+        with self.lock:
+            self.indices[key] = (signature, index)
+            self.indices.move_to_end(key)
+
+            if len(self.indices) > self.max_size:
+                self.indices.popitem(last=False)
+
+        return index
+
+
+# Indices shared by all requests of a process
+place_metrics_index_cache = PlaceMetricsIndexCache()
@@ -0,0 +1,109 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from routing_graph import decode_node_ids, get_node_id_array
+
+# Earth radius in meters as used by osmnx
+EARTH_RADIUS = 6_371_009
+
+
+def get_cartesian_coordinates(longitudes, latitudes):
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+
+    return np.column_stack((
+        EARTH_RADIUS * np.cos(lat) * np.cos(lon),
+        EARTH_RADIUS * np.cos(lat) * np.sin(lon),
+        EARTH_RADIUS * np.sin(lat)
+    ))
+
+
+def get_arc_lengths(chord_lengths):
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord_lengths / (2 * EARTH_RADIUS), 0, 1))
+
+
+def get_chord_length(arc_length):
+    return 2 * EARTH_RADIUS * np.sin(min(arc_length / (2 * EARTH_RADIUS), np.pi / 2))
+
+
+class NodeIndex:
+    """
+    KD-tree over nodes projected onto a sphere, used to snap coordinates to their nearest nodes and to find nodes
+    within a radius
+    """
+
+    def __init__(self, node_ids, longitudes, latitudes, node_id_kind=None):
+        self.node_ids = np.asarray(node_ids)
+        self.node_id_kind = node_id_kind
+        self.tree = cKDTree(get_cartesian_coordinates(longitudes, latitudes))
+
+    @classmethod
+    def from_graph(cls, graph):
+        node_ids = list(graph.nodes)
+
+        return cls(
+            node_ids=get_node_id_array(node_ids),
+            longitudes=[float(graph.nodes[node_id]["x"]) for node_id in node_ids],
+            latitudes=[float(graph.nodes[node_id]["y"]) for node_id in node_ids]
+        )
+
+    @classmethod
+    def from_routing_graph(cls, routing_graph):
+        return cls(node_ids=routing_graph.node_ids, longitudes=routing_graph.x, latitudes=routing_graph.y,
+                   node_id_kind=routing_graph.node_id_kind)
+
+    def get_nearest_positions(self, longitudes, latitudes):
+        """
+        Snaps coordinates to the positions of their nearest nodes, which are routing graph indices if the index has
+        been built from a routing graph
+        :param longitudes: array of longitudes
+        :param latitudes: array of latitudes
+        :return: array of node positions and array of great-circle distances in meters
+        """
+        chord_lengths, positions = self.tree.query(get_cartesian_coordinates(longitudes, latitudes))
+
+        return positions.astype(np.int64), get_arc_lengths(chord_lengths)
+
+    def get_nearest_nodes(self, longitudes, latitudes):
+        """
+        Snaps coordinates to their nearest nodes
+        :param longitudes: array of longitudes
+        :param latitudes: array of latitudes
+        :return: array of node ids and array of great-circle distances in meters
+        """
+        positions, distances = self.get_nearest_positions(longitudes, latitudes)
+
+        if self.node_id_kind == "json":
+            return get_node_id_array(decode_node_ids(self.node_id_kind, self.node_ids[positions])), distances
+        else:
+            return self.node_ids[positions], distances
+
+    def get_positions_in_radius(self, longitudes, latitudes, radius):
+        """
+        Finds the positions of all nodes within a great-circle distance of each coordinate
+        :param longitudes: array of longitudes
+        :param latitudes: array of latitudes
+        :param radius: great-circle distance in meters
+        :return: list with one sorted array of node positions per coordinate
+        """
+        # Great-circle distances grow monotonically with straight-line distances through the sphere
+        positions = self.tree.query_ball_point(get_cartesian_coordinates(longitudes, latitudes),
+                                               r=get_chord_length(radius), return_sorted=True)
+
+        return [np.asarray(point_positions, dtype=np.int64) for point_positions in positions]
+
+    def get_nodes_in_radius(self, longitudes, latitudes, radius):
+        """
+        Finds all nodes within a great-circle distance of each coordinate
+        :param longitudes: array of longitudes
+        :param latitudes: array of latitudes
+        :param radius: great-circle distance in meters
+        :return: list with one array of node ids per coordinate
+        """
+        if self.node_id_kind == "json":
+            return [get_node_id_array(decode_node_ids(self.node_id_kind, self.node_ids[positions]))
+                    for positions in self.get_positions_in_radius(longitudes, latitudes, radius)]
+        else:
+            return [self.node_ids[positions] for positions in self.get_positions_in_radius(longitudes, latitudes,
+                                                                                           radius)]
+
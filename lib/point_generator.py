@@ -1,143 +1,124 @@
 import csv
 import json
 import os
-import random
 
-from geojson import FeatureCollection
-from osgeo import ogr
+import numpy as np
 from tqdm import tqdm
 
+from city_boundaries import get_city_boundaries
+from geojson_writer import GeojsonWriter
+from habitable_area import HabitableAreaBuilder
+from landuse_index import LanduseIndexBuilder
 from tracking_decorator import TrackingDecorator
 
 
-def read_geojson(file_path):
-    file = open(file_path)
-    return json.load(file)
+def get_random_points_in_polygons(city_boundaries, landuse_index, sample_points, batch_size=10_000, rng=np.random):
+    """
+    Draws batches of random points within the bounding box of a city and keeps those in the desired area until the
+    requested number of points is reached
+    :param city_boundaries: city boundaries
+    :param landuse_index: index of polygons in which no points must be placed
+    :param sample_points: number of points to generate
+    :param batch_size: number of candidates drawn at once
+    :param rng: random number generator
+    :return: arrays of longitudes and latitudes, and the share of accepted candidates
+    """
+    longitudes = []
+    latitudes = []
+    num_points = 0
+    num_candidates = 0
+    num_accepted = 0
 
+    # Get bounding box
+    xmin, ymin, xmax, ymax = city_boundaries.bounds
 
-def get_polygons(geojson):
-    polygons = []
+    with tqdm(total=sample_points, unit="points", desc="Generate points") as progress_bar:
+        while num_points < sample_points:
+            candidate_longitudes = rng.uniform(xmin, xmax, batch_size)
+            candidate_latitudes = rng.uniform(ymin, ymax, batch_size)
+            num_candidates += batch_size
 
-    # Extract polygons from inhabitants file
-    features = geojson["features"]
+            desired = is_in_desired_area(candidate_longitudes, candidate_latitudes, city_boundaries, landuse_index)
+            num_accepted += np.count_nonzero(desired)
 
-    for feature in features:
-        geom = feature["geometry"]
-        geom = json.dumps(geom)
-        polygon = ogr.CreateGeometryFromJson(geom)
+            accepted_longitudes = candidate_longitudes[desired][:sample_points - num_points]
+            accepted_latitudes = candidate_latitudes[desired][:sample_points - num_points]
 
-        polygons.append(polygon)
+            longitudes.append(accepted_longitudes)
+            latitudes.append(accepted_latitudes)
+            num_points += len(accepted_longitudes)
+            progress_bar.update(len(accepted_longitudes))
 
-    return polygons
+    return np.concatenate(longitudes), np.concatenate(latitudes), num_accepted / num_candidates
 
 
-def get_bounding_box(polygon):
-    env = polygon.GetEnvelope()
-    return env[0], env[2], env[1], env[3]
+def is_in_desired_area(longitudes, latitudes, city_boundaries, landuse_index):
+    desired = city_boundaries.contains(longitudes, latitudes)
+    desired[desired] = ~landuse_index.contains(longitudes[desired], latitudes[desired])
 
+    return desired
 
-def get_random_points_in_polygons(valid_polygons, invalid_polygons, sample_points):
-    points = []
-    xmin = None
-    ymin = None
-    xmax = None
-    ymax = None
 
-    for polygon in valid_polygons:
+def write_coords_to_npy(coords, file_path):
+    # Write to temporary file first so that an interrupted run does not leave broken sample points
+    temporary_file_path = file_path[:-len(".npy")] + ".tmp.npy"
+    np.save(temporary_file_path, np.ascontiguousarray(coords, dtype=np.float64))
+    os.replace(temporary_file_path, file_path)
 
-        # Get bounding box
-        boundingXmin, boundingYmin, boundingXmax, boundingYmax = get_bounding_box(polygon)
 
-        if xmin == None or boundingXmin < xmin:
-            xmin = boundingXmin
-        if ymin == None or boundingYmin < ymin:
-            ymin = boundingYmin
-        if xmax == None or boundingXmax > xmax:
-            xmax = boundingXmax
-        if ymax == None or boundingYmax > ymax:
-            ymax = boundingYmax
+def load_coords_from_npy(file_path):
+    return np.load(file_path, mmap_mode="r", allow_pickle=False)
 
-    counter = 0
-    fail_counter = 0
 
-    progress_bar = tqdm(iterable=range(1, sample_points + 1), unit="points", desc="Generate points")
-    for _ in progress_bar:
-
-        while True:
-            point = ogr.Geometry(ogr.wkbPoint)
-            point.AddPoint(random.uniform(xmin, xmax),
-                           random.uniform(ymin, ymax))
-
-            if is_in_desired_area(point, valid_polygons, invalid_polygons):
-                points.append(point)
-                counter += 1
-                break
-            else:
-                fail_counter += 1
-
-    return points
-
-
-def is_in_desired_area(point, valid_polygons, invalid_polygons):
-    in_district = False
-    for polygon in valid_polygons:
-        if point.Within(polygon):
-            in_district = True
-            break
-
-    if not in_district:
-        return False
-
-    for polygon in invalid_polygons:
-        if point.Within(polygon):
-            return False
-
-    return True
+def write_metadata_to_json(metadata, file_path):
+    with open(file_path, "w") as f:
+        json.dump(metadata, f, indent=4)
 
 
-def get_coordinates(points):
-    data = []
-    for p in points:
-        coord = {}
-        coord["lon"] = p.GetX()
-        coord["lat"] = p.GetY()
-        data.append(coord)
+def load_metadata_from_json(file_path):
+    # Sample points generated before metadata was recorded were drawn at random without a seed
+    if not os.path.exists(file_path):
+        return {"seed": None, "sampling_mode": "random"}
 
-    return data
+    with open(file_path, "r") as f:
+        return json.load(f)
 
 
-def write_coords_to_json(coords, file_path):
-    json_data = json.dumps(coords)
-    with open(file_path, "w") as f:
-        f.write("%s" % json_data)
+def is_metadata_matching(metadata, seed, sampling_mode):
+    return metadata["sampling_mode"] == sampling_mode and (seed is None or metadata["seed"] == seed)
 
 
-def load_coord_from_json(file_path):
+def load_coords_from_json(file_path):
     with open(file_path, "r") as f:
-        text = f.read()
+        coords = json.load(f)
 
-    return json.loads(text)
+    return np.array([[float(coord["lon"]), float(coord["lat"])] for coord in coords], dtype=np.float64).reshape(-1, 2)
 
 
 def write_coords_to_csv(coords, file_path):
     with open(file_path, "w") as f:
         writer = csv.writer(f)
-        for coord in coords:
-            writer.writerow([coord["lon"], coord["lat"]])
+        for longitude, latitude in coords.tolist():
+            writer.writerow([longitude, latitude])
 
 
-def write_coords_to_geojson(coords, file_path):
-    features = []
-    for coord in coords:
-        feature = {}
-        feature["geometry"] = {"type": "Point", "coordinates": [coord["lon"], coord["lat"]]}
-        feature["type"] = "Feature"
-        features.append(feature)
+def write_coords_to_geojson(coords, file_path, precision=None, compress=False):
+    with GeojsonWriter(file_path, precision=precision, compress=compress) as writer:
+        for longitude, latitude in coords.tolist():
+            writer.write_feature(geometry={"type": "Point", "coordinates": [longitude, latitude]})
 
-    collection = FeatureCollection(features)
 
-    with open(file_path, "w") as f:
-        f.write("%s" % collection)
+def export_coords(coords, results_path, export_csv=False, export_geojson=False):
+    if export_csv and not os.path.exists(os.path.join(results_path, "sample-points.csv")):
+        write_coords_to_csv(coords, os.path.join(results_path, "sample-points.csv"))
+    if export_geojson and not os.path.exists(os.path.join(results_path, "sample-points.geojson")):
+        write_coords_to_geojson(coords, os.path.join(results_path, "sample-points.geojson"))
+
+
+def remove_outdated_files(results_path):
+    for file_name in ["sample-points.json", "sample-points.csv", "sample-points.geojson"]:
+        if os.path.exists(os.path.join(results_path, file_name)):
+            os.remove(os.path.join(results_path, file_name))
 
 
 #
@@ -147,50 +128,90 @@ def write_coords_to_geojson(coords, file_path):
 class PointGenerator:
 
     @TrackingDecorator.track_time
-    def run(self, logger, data_path, results_path, city_id="berlin", num_sample_points=10_000, quiet=False, clean=False):
+    def run(self, logger, data_path, results_path, city_id="berlin", num_sample_points=10_000, landuse_results_path=None,
+            seed=None, sampling_mode="random", rejection_sampling=False, export_csv=False, export_geojson=False,
+            quiet=False, clean=False):
 
         # Make results path
         os.makedirs(os.path.join(results_path), exist_ok=True)
 
-        # Check if result needs to be generated
-        if clean or not os.path.exists(os.path.join(results_path, "sample-points.json")):
+        # Define file path
+        file_path = os.path.join(results_path, "sample-points.npy")
 
-            # Define valid polygons
-            polygon_file = os.path.join(data_path, "cities", city_id, "boundaries", "boundaries.geojson")
-            valid_polygons = get_polygons(read_geojson(polygon_file))
+        # Convert sample points from previous runs
+        if not clean and not os.path.exists(file_path) and \
+                os.path.exists(os.path.join(results_path, "sample-points.json")):
+            write_coords_to_npy(load_coords_from_json(os.path.join(results_path, "sample-points.json")), file_path)
 
-            # Define invalid polygons
-            invalid_polygons = []
-            for invalid_polygon in ["cemetery.geojson", "farmland.geojson", "farmyard.geojson", "forest.geojson",
-                                    "garden.geojson", "park.geojson", "recreation_ground.geojson", "water.geojson",
-                                    "wood.geojson"]:
-                polygon_file = os.path.join(data_path, "cities", city_id, "landuse", invalid_polygon)
-                if os.path.exists(polygon_file):
-                    invalid_polygons += get_polygons(read_geojson(polygon_file))
+        # Check if result needs to be generated
+        if clean or not os.path.exists(file_path) or \
+                not is_metadata_matching(load_metadata_from_json(os.path.join(results_path, "sample-points-meta.json")),
+                                         seed, sampling_mode):
+
+            # Record seed so that the same points can be generated again
+            if seed is None:
+                seed = np.random.SeedSequence().entropy
+            rng = np.random.default_rng(seed)
+
+            # Define valid area
+            city_boundaries = get_city_boundaries(data_path, city_id)
+
+            # Define invalid areas
+            landuse_index = LanduseIndexBuilder().run(
+                logger=logger,
+                data_path=data_path,
+                results_path=landuse_results_path if landuse_results_path is not None else results_path,
+                city_id=city_id,
+                clean=clean,
+                quiet=quiet
+            )
 
             # Generate points in polygons
-            points = get_random_points_in_polygons(valid_polygons, invalid_polygons, num_sample_points)
-
-            # Get coordinates
-            coords = get_coordinates(points)
+            if rejection_sampling and sampling_mode == "random":
+                longitudes, latitudes, acceptance_rate = get_random_points_in_polygons(city_boundaries, landuse_index,
+                                                                                       num_sample_points, rng=rng)
+            else:
+                habitable_area = HabitableAreaBuilder().run(
+                    logger=logger,
+                    data_path=data_path,
+                    results_path=landuse_results_path if landuse_results_path is not None else results_path,
+                    city_id=city_id,
+                    landuse_index=landuse_index,
+                    clean=clean,
+                    quiet=quiet
+                )
+
+                # Points drawn from the habitable area are always valid
+                if sampling_mode == "stratified":
+                    longitudes, latitudes = habitable_area.sample_stratified(num_sample_points, rng)
+                else:
+                    longitudes, latitudes = habitable_area.sample(num_sample_points, rng)
+                acceptance_rate = 1.0
 
             # Write coords to file
-            write_coords_to_json(coords, os.path.join(results_path, "sample-points.json"))
-            write_coords_to_csv(coords, os.path.join(results_path, "sample-points.csv"))
-            write_coords_to_geojson(coords, os.path.join(results_path, "sample-points.geojson"))
+            remove_outdated_files(results_path)
+            write_coords_to_npy(np.column_stack((longitudes, latitudes)), file_path)
+            write_metadata_to_json({
+                "seed": seed,
+                "sampling_mode": sampling_mode,
+                "rejection_sampling": rejection_sampling and sampling_mode == "random",
+                "num_sample_points": num_sample_points
+            }, os.path.join(results_path, "sample-points-meta.json"))
 
             if not quiet:
-                logger.log_line(f"✓️ Generate {str(num_sample_points)} sample points in {city_id}")
+                logger.log_line(f"✓️ Generate {str(num_sample_points)} {sampling_mode} sample points in {city_id} "
+                                f"with seed {seed} and an acceptance rate of {acceptance_rate:.1%}")
 
-            return coords
-        else:
+        # Memory-map sample points so that they are only read when needed
+        coords = load_coords_from_npy(file_path)
 
-            coords = load_coord_from_json(os.path.join(results_path, "sample-points.json"))
+        if not quiet:
+            logger.log_line(f"✓️ Load {str(len(coords))} sample points for {city_id}")
+        if len(coords) != num_sample_points:
+            logger.log_line(
+                f"✗️ Warning: mismatch between number of requested sample points {str(num_sample_points)} and loaded sample points {len(coords)}")
 
-            if not quiet:
-                logger.log_line(f"✓️ Load {str(len(coords))} sample points for {city_id}")
-            if len(coords) != num_sample_points:
-                logger.log_line(
-                    f"✗️ Warning: mismatch between number of requested sample points {str(num_sample_points)} and loaded sample points {len(coords)}")
+        # Export sample points only if requested
+        export_coords(coords, results_path, export_csv=export_csv, export_geojson=export_geojson)
 
-            return coords
+        return coords
@@ -0,0 +1,206 @@
+import heapq
+import json
+import os
+import shutil
+
+import numpy as np
+from tracking_decorator import TrackingDecorator
+
+ROUTING_GRAPH_ARRAYS = ["node_ids", "x", "y", "indptr", "indices", "weights"]
+
+
+def get_edge_weights(graph, weight):
+    edge_weights = {}
+
+    # Keep the cheapest of parallel edges, missing weights count as 1 like in networkx
+    for u, v, data in graph.edges(data=True):
+        edge_weight = float(data.get(weight, 1))
+        if (u, v) not in edge_weights or edge_weight < edge_weights[(u, v)]:
+            edge_weights[(u, v)] = edge_weight
+
+    return edge_weights
+
+
+def get_node_id_array(node_ids):
+    if all(isinstance(node_id, (int, np.integer)) for node_id in node_ids):
+        return np.array(node_ids, dtype=np.int64)
+    else:
+        return np.array(node_ids, dtype=object)
+
+
+def encode_node_ids(node_ids):
+    # Mixed node ids are stored as JSON strings so that they can be memory-mapped without pickling
+    if node_ids.dtype.kind == "i":
+        return "int", node_ids
+    else:
+        return "json", np.array([json.dumps(node_id) for node_id in node_ids.tolist()], dtype=str)
+
+
+def decode_node_ids(node_id_kind, node_ids):
+    if node_id_kind == "json":
+        return [json.loads(node_id) for node_id in node_ids.tolist()]
+    else:
+        return node_ids.tolist()
+
+
+def save_routing_graph(routing_graph, results_path):
+    """
+    Saves a routing graph as a directory of uncompressed arrays that can be memory-mapped
+    :param routing_graph: routing graph to save
+    :param results_path: directory to save arrays to
+    """
+    node_id_kind, node_ids = encode_node_ids(routing_graph.node_ids)
+    arrays = {
+        "node_ids": node_ids,
+        "x": routing_graph.x,
+        "y": routing_graph.y,
+        "indptr": routing_graph.indptr,
+        "indices": routing_graph.indices,
+        "weights": routing_graph.weights
+    }
+
+    # Write to temporary directory first so that an interrupted save does not leave a broken cache
+    temporary_results_path = results_path + ".tmp"
+    shutil.rmtree(temporary_results_path, ignore_errors=True)
+    os.makedirs(temporary_results_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary_results_path, name + ".npy"), np.ascontiguousarray(array))
+
+    with open(os.path.join(temporary_results_path, "metadata.json"), "w") as json_file:
+        json.dump({"node_id_kind": node_id_kind}, json_file)
+
+    shutil.rmtree(results_path, ignore_errors=True)
+    os.replace(temporary_results_path, results_path)
+
+
+def load_routing_graph(results_path, mmap_mode="r"):
+    """
+    Loads a routing graph saved with save_routing_graph
+    :param results_path: directory to load arrays from
+    :param mmap_mode: memory-map mode passed to numpy, read-only mappings are shared between processes
+    :return: routing graph backed by the mapped files
+    """
+    with open(os.path.join(results_path, "metadata.json"), "r") as json_file:
+        metadata = json.load(json_file)
+
+    arrays = {name: np.load(os.path.join(results_path, name + ".npy"), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in ROUTING_GRAPH_ARRAYS}
+
+    return RoutingGraph(node_id_kind=metadata["node_id_kind"], **arrays)
+
+
+#
+# Main
+#
+
+class RoutingGraph:
+    """
+    Compact representation of a graph for shortest path searches. Nodes are mapped to contiguous indices and
+    outgoing edges are stored in compressed sparse row (CSR) form
+    """
+
+    def __init__(self, node_ids, x, y, indptr, indices, weights, node_id_kind=None):
+        self.node_ids = node_ids
+        self.node_id_kind = node_id_kind
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.node_indices = None
+
+    @classmethod
+    def from_graph(cls, graph, weight="time"):
+        node_ids = list(graph.nodes)
+        node_indices = {node_id: node_index for node_index, node_id in enumerate(node_ids)}
+
+        edge_weights = get_edge_weights(graph, weight)
+
+        sources = np.fromiter((node_indices[u] for u, _ in edge_weights.keys()), dtype=np.int32,
+                              count=len(edge_weights))
+        targets = np.fromiter((node_indices[v] for _, v in edge_weights.keys()), dtype=np.int32,
+                              count=len(edge_weights))
+        weights = np.fromiter(edge_weights.values(), dtype=np.float64, count=len(edge_weights))
+
+        # Sort edges by source node to build row pointers
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+
+        return cls(
+            node_ids=get_node_id_array(node_ids),
+            x=np.array([float(graph.nodes[node_id]["x"]) for node_id in node_ids], dtype=np.float64),
+            y=np.array([float(graph.nodes[node_id]["y"]) for node_id in node_ids], dtype=np.float64),
+            indptr=indptr,
+            indices=targets[order],
+            weights=weights[order]
+        )
+
+    def get_node_index(self, node_id):
+        # Build lookup only when needed so that processes working on node indices do not pay for it
+        if self.node_indices is None:
+            self.node_indices = {node_id: node_index
+                                 for node_index, node_id in enumerate(decode_node_ids(self.node_id_kind, self.node_ids))}
+
+        return self.node_indices[node_id]
+
+    def get_reachable_nodes(self, source_index, radius):
+        """
+        Runs a Dijkstra search from a source node that stops at the given radius
+        :param source_index: index of the node to start from
+        :param radius: maximum distance in units of the edge weights
+        :return: indices of reached nodes and their distances from the source node, in order of distance
+        """
+        distances = {source_index: 0.0}
+        reached_indices = []
+        reached_distances = []
+        settled = set()
+        heap = [(0.0, source_index)]
+
+        while heap:
+            distance, node_index = heapq.heappop(heap)
+
+            if node_index in settled:
+                continue
+
+            settled.add(node_index)
+            reached_indices.append(node_index)
+            reached_distances.append(distance)
+
+            start, end = self.indptr[node_index], self.indptr[node_index + 1]
+            for neighbour_index, weight in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                neighbour_distance = distance + weight
+
+                if neighbour_distance <= radius and neighbour_distance < distances.get(neighbour_index, np.inf):
+                    distances[neighbour_index] = neighbour_distance
+                    heapq.heappush(heap, (neighbour_distance, neighbour_index))
+
+        return np.array(reached_indices, dtype=np.int64), np.array(reached_distances, dtype=np.float64)
+
+
+class RoutingGraphBuilder:
+
+    @TrackingDecorator.track_time
+    def run(self, logger, results_path, graph, file_name, clean=False, quiet=False):
+        # Make results path
+        os.makedirs(os.path.join(results_path), exist_ok=True)
+
+        # Define file path
+        file_path = os.path.join(results_path, file_name)
+
+        # Check if result needs to be generated
+        if clean or not os.path.exists(file_path):
+            save_routing_graph(RoutingGraph.from_graph(graph), file_path)
+
+            if not quiet:
+                logger.log_line(f"✓ Build {file_path}")
+
+        # Memory-map routing graph so that all processes share the same pages
+        routing_graph = load_routing_graph(file_path)
+
+        if not quiet:
+            logger.log_line(f"✓ Load {file_path} with {len(routing_graph.node_ids)} nodes and "
+                            f"{len(routing_graph.indices)} edges")
+
+        return routing_graph
@@ -28,11 +28,14 @@ from peartree_graph_loader import PeartreeGraphLoader
 from overpass_station_loader import OverpassStationLoader
 from overpass_line_loader import OverpassLineLoader
 from overpass_route_loader import OverpassRouteLoader
+from overpass_cache import OverpassCache
+from overpass_fetcher import OverpassFetcher, get_public_transport_requests
 from osm_to_geojson_converter import OsmToGeojsonConverter
 from osmnx_graph_loader import OsmnxGraphLoader
 from graph_transformer import GraphTransformer
 from logger_facade import LoggerFacade
 from isochrone_builder import IsochroneBuilder
+from routing_graph import RoutingGraphBuilder
 from google_cloud_platform_bucket_uploader import GoogleCloudPlatformBucketUploader
 from cities import Cities
 
@@ -46,14 +49,21 @@ def main(argv):
     clean = False
     quiet = False
     points_per_sqkm = 100
+    processes = 1
+    seed = None
+    sampling_mode = "random"
+    export_sample_points = False
+    invalidate_pattern = None
     start_end_times = [(int(7 * 60 * 60), int(7.25 * 60 * 60))]
     travel_times = [15]
 
     # Read command line arguments
     try:
-        opts, args = getopt.getopt(argv, "hcqp:", ["help", "clean", "quiet", "points_per_sqkm="])
+        opts, args = getopt.getopt(argv, "hcqep:j:s:m:x:", ["help", "clean", "quiet", "export", "points_per_sqkm=",
+                                                             "processes=", "seed=", "sampling_mode=", "invalidate="])
     except getopt.GetoptError:
-        print("main.py --help --clean --quiet --points_per_sqkm <points>")
+        print("main.py --help --clean --quiet --export --points_per_sqkm <points> --processes <processes> "
+              "--seed <seed> --sampling_mode <random|stratified> --invalidate <pattern>")
         sys.exit(2)
     for opt, arg in opts:
         if opt in ("-h", "--help"):
@@ -61,19 +71,68 @@ def main(argv):
             print("--help                           show this help")
             print("--clean                          clean intermediate results before start")
             print("--quiet                          do not log outputs")
+            print("--export                         export sample points as CSV and GeoJSON, always when uploading")
             print("--points_per_sqkm                number of sample points to use")
+            print("--processes                      number of processes to build isochrones with")
+            print("--seed                           seed to generate sample points with")
+            print("--sampling_mode                  random or stratified sample points")
+            print("--invalidate                     remove cached Overpass responses whose names match a pattern")
             sys.exit()
         elif opt in ("-c", "--clean"):
             clean = True
         elif opt in ("-q", "--quiet"):
             quiet = True
+        elif opt in ("-e", "--export"):
+            export_sample_points = True
         elif opt in ("-p", "--points_per_sqkm"):
             points_per_sqkm = int(arg)
+        elif opt in ("-j", "--processes"):
+            processes = int(arg)
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt in ("-m", "--sampling_mode"):
+            if arg not in ("random", "stratified"):
+                print("--sampling_mode must be random or stratified")
+                sys.exit(2)
+            sampling_mode = arg
+        elif opt in ("-x", "--invalidate"):
+            invalidate_pattern = arg
 
     # Set paths
     data_path = os.path.join(script_path, "data", "data")
     base_results_path = os.path.join(script_path, "results", "results")
 
+    # Results are only uploaded if the bucket credentials are available
+    upload_results = GoogleCloudPlatformBucketUploader().is_configured()
+
+    # Initialize logger
+    base_logger = LoggerFacade(base_results_path, console=True, file=True)
+
+    # Remove selected cached Overpass responses so that they are downloaded again
+    if invalidate_pattern is not None:
+        for city in Cities().cities:
+            num_removed = OverpassCache(os.path.join(base_results_path, city["id"], "osm")).invalidate(
+                invalidate_pattern)
+
+            if not quiet:
+                base_logger.log_line(f"✓ Invalidate {num_removed} cached responses of {city['id']}")
+
+    # Download public transport data of all cities concurrently
+    OverpassFetcher().run(
+        logger=base_logger,
+        requests=[request
+                  for city in Cities().cities
+                  for public_transport_type in city["public_transport_types"]
+                  for request in get_public_transport_requests(
+                      results_path=os.path.join(base_results_path, city["id"], "osm"),
+                      city_id=city["id"],
+                      bounding_box=city["bounding_box"],
+                      public_transport_type=public_transport_type
+                  )],
+        clean=clean,
+        quiet=quiet
+    )
+
     # Iterate over cities
     for city in Cities().cities:
 
@@ -91,26 +150,31 @@ def main(argv):
         # Initialize logger
         logger = LoggerFacade(results_path, console=True, file=True)
 
-        # Generate sample points
+        # Generate sample points, the bucket publishes them as CSV and GeoJSON
         sample_points = PointGenerator().run(
             logger=logger,
             data_path=data_path,
             results_path=os.path.join(results_path, "sample-points"),
             city_id=city_id,
             num_sample_points=area * points_per_sqkm,
+            landuse_results_path=os.path.join(results_path, "landuse"),
+            seed=seed,
+            sampling_mode=sampling_mode,
+            export_csv=export_sample_points or upload_results,
+            export_geojson=export_sample_points or upload_results,
             clean=clean,
             quiet=quiet
         )
 
         for public_transport_type in public_transport_types:
-            # Load stations
+            # Load stations, already downloaded by the fetch stage unless the download failed
             OverpassStationLoader().run(
                 logger=logger,
                 results_path=os.path.join(results_path, "osm"),
                 city_id=city_id,
                 bounding_box=bounding_box,
-                transport=public_transport_type,
-                clean=clean,
+                public_transport_type=public_transport_type,
+                clean=False,
                 quiet=quiet
             )
 
@@ -121,7 +185,7 @@ def main(argv):
                 city_id=city_id,
                 bounding_box=bounding_box,
                 public_transport_type=public_transport_type,
-                clean=clean,
+                clean=False,
                 quiet=quiet
             )
 
@@ -132,7 +196,7 @@ def main(argv):
                 city_id=city_id,
                 bounding_box=bounding_box,
                 public_transport_type=public_transport_type,
-                clean=clean,
+                clean=False,
                 quiet=quiet
             )
 
@@ -184,20 +248,31 @@ def main(argv):
                 quiet=quiet
             )
 
-            # Iterate over travel times
-            for travel_time in travel_times:
-                # Build isochrones
-                IsochroneBuilder().run(
-                    logger=logger,
-                    data_path=data_path,
-                    results_path=os.path.join(results_path, "geojson"),
-                    city_id=city_id,
-                    graph=graph,
-                    sample_points=sample_points,
-                    travel_time=travel_time,
-                    start_time=start_time,
-                    end_time=end_time
-                )
+            # Build memory-mapped routing graph shared by all isochrone processes
+            routing_graph = RoutingGraphBuilder().run(
+                logger=logger,
+                results_path=os.path.join(results_path, "graphs", "peartree"),
+                graph=graph,
+                file_name=f"transport-{start_time}-{end_time}-routing",
+                clean=clean,
+                quiet=quiet
+            )
+
+            # Build isochrones for all travel times at once
+            IsochroneBuilder().run_for_travel_times(
+                logger=logger,
+                data_path=data_path,
+                results_path=os.path.join(results_path, "geojson"),
+                city_id=city_id,
+                graph=graph,
+                sample_points=sample_points,
+                travel_times=travel_times,
+                start_time=start_time,
+                end_time=end_time,
+                routing_graph=routing_graph,
+                processes=processes,
+                clean=clean
+            )
 
             # Upload results
             GoogleCloudPlatformBucketUploader().upload_data(